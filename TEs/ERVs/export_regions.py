@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Export candidate TE/ERV regions from a (masked) FASTA in one pass, and run gmsuite on them.
+
+Regions are either the records listed in a file (e.g. scaffold.ls), all records of the FASTA,
+or the arrays of a repeat GFF: consecutive annotations of the same element (GFF3
+Target=X or Target "Motif:X", else Name, else the feature type), with nothing annotated
+in between, are consolidated into one region when a unit starts before the previous end
+plus --merge-distance (the gff3Merger.py rule), and --match keeps only the matching
+elements (e.g. Tgut716A).
+
+The FASTA is indexed once (.fai, built if missing) and memory-mapped, and regions are read
+in file order. Optional filters mirror the preprocessing of the masked FASTA: masked runs
+collapsed to a single N (--single-ns), a minimum length (--min-length), and telomeric
+regions excluded (--telo-distance from the sequence ends for GFF regions, --telo-fraction
+of (TTAGGG)n).
+Regions are written one per FASTA or in --shards files, and gmsn.pl can be run on every
+file in a bounded worker pool.
+
+Usage:
+  python export_regions.py Tgut716A.repeats-only.fasta.masked --names scaffold.ls --single-ns --min-length 100 \\
+      --telo-fraction 0.5 --outdir out --gmsn ../../gmsuite/gmsn.pl --threads 16
+  python export_regions.py genome.fasta --gff units.gff --match Tgut716A --merge-distance 1000 --outdir regions
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from multiprocessing.pool import ThreadPool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from indexed_fasta import IndexedFasta
+
+# GFF3 Target=Tgut716A 1 80 (units/*.gff, as gff3Merger.py reads it) or Target "Motif:Tgut716A" 1 80
+TARGET_RE = re.compile(r'Target[= ]"?(?:Motif:)?([^"\s;]+)')
+NAME_RE = re.compile(r'Name=([^;]+)')
+N_RUN_RE = re.compile(rb"[Nn]+")
+TELO_RE = re.compile(rb"(?:TTAGGG){3,}|(?:CCCTAA){3,}", re.IGNORECASE)
+
+
+def element(attributes, feature_type):
+    """Element of an annotation: the Target name, else Name, else the feature type.
+
+    >>> element("ID=1;Target=Tgut716A 1 80", "dispersed_repeat")
+    'Tgut716A'
+    >>> element('Target "Motif:Tgut191A" 1 191', "dispersed_repeat")
+    'Tgut191A'
+    >>> element("ID=2;Name=ERV1", "repeat_region")
+    'ERV1'
+    >>> element(".", "dispersed_repeat")
+    'dispersed_repeat'
+    """
+    m = TARGET_RE.search(attributes) or NAME_RE.search(attributes)
+    return m.group(1) if m else feature_type
+
+
+def merged_regions(gff, merge_distance=0, match=None):
+    """Arrays of consecutive same-element annotations as (chrom, start, end, element, units), 0-based half-open.
+
+    As in gff3Merger.py, a unit joins the current array when start < previous end + merge_distance
+    (1-based GFF coordinates).
+
+    >>> import tempfile
+    >>> with tempfile.NamedTemporaryFile("w", suffix=".gff", delete=False) as f:
+    ...     _ = f.write("##gff-version 3\\n"
+    ...                 "chr1\\tRM\\tdispersed_repeat\\t101\\t180\\t.\\t+\\t.\\tTarget=Tgut716A 1 80\\n"
+    ...                 "chr1\\tRM\\tdispersed_repeat\\t190\\t269\\t.\\t+\\t.\\tTarget=Tgut716A 1 80\\n"
+    ...                 "chr1\\tRM\\tdispersed_repeat\\t280\\t470\\t.\\t-\\t.\\tTarget=Tgut191A 1 191\\n")
+    >>> merged_regions(f.name, 11)
+    [('chr1', 100, 269, 'Tgut716A', 2), ('chr1', 279, 470, 'Tgut191A', 1)]
+    >>> merged_regions(f.name, 10, match="Tgut716A")
+    [('chr1', 100, 180, 'Tgut716A', 1), ('chr1', 189, 269, 'Tgut716A', 1)]
+    """
+    features = {}
+    with open(gff) as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            p = line.rstrip("\n").split("\t")
+            if len(p) < 9:
+                continue
+            features.setdefault(p[0], []).append((int(p[3]), int(p[4]), element(p[8], p[2])))
+
+    regions = []
+    for chrom, feats in features.items():
+        feats.sort()
+        current = None
+        for start, end, elem in feats:
+            if current and elem == current[3] and start < current[2] + merge_distance:
+                current[2] = max(current[2], end)
+                current[4] += 1
+                continue
+            if current:
+                regions.append(tuple(current))
+            current = [chrom, start - 1, end, elem, 1]
+        if current:
+            regions.append(tuple(current))
+    if match:
+        regions = [r for r in regions if match in r[3]]
+    return regions
+
+
+def record_regions(fasta, names=None):
+    """Whole records (all, or those listed in names) as regions."""
+    if names is None:
+        names = list(fasta.index)
+    missing = [n for n in names if n not in fasta.index]
+    if missing:
+        sys.stderr.write(f"[WARN] {len(missing)} names not in the FASTA (e.g. {missing[0]})\n")
+    return [(n, 0, fasta.length(n), None, None) for n in names if n in fasta.index]
+
+
+def telomeric_fraction(seq):
+    return sum(m.end() - m.start() for m in TELO_RE.finditer(seq)) / max(len(seq), 1)
+
+
+def export_regions(fasta, regions, outdir, shards=0, min_length=0, single_ns=False,
+                   telo_distance=0, telo_fraction=None, width=60):
+    """Write the regions passing the filters; returns the FASTA files written and the number of regions kept."""
+    os.makedirs(outdir, exist_ok=True)
+    # file order, so the mapped FASTA is read sequentially
+    regions = sorted(regions, key=lambda r: (fasta.index[r[0]][1], r[1]))
+    shard_files = [open(os.path.join(outdir, f"shard_{i:03d}.fa"), "wb") for i in range(shards)]
+    files, kept = [f.name for f in shard_files], 0
+    for chrom, start, end, elem, units in regions:
+        length = fasta.length(chrom)
+        whole = start == 0 and end == length
+        if telo_distance and not whole and (start < telo_distance or end > length - telo_distance):
+            continue
+        seq = fasta.fetch(chrom, start, end)
+        if single_ns:
+            seq = N_RUN_RE.sub(b"N", seq)
+        if len(seq) < min_length:
+            continue
+        if telo_fraction is not None and telomeric_fraction(seq) >= telo_fraction:
+            continue
+
+        name = chrom if whole else f"{chrom}:{start + 1}-{end}"
+        header = f">{name}" + (f" {elem} units={units}" if elem is not None else "")
+        record = header.encode() + b"\n" + b"\n".join(seq[i:i + width] for i in range(0, len(seq), width)) + b"\n"
+        if shards:
+            shard_files[kept % shards].write(record)
+        else:
+            path = os.path.join(outdir, re.sub(r"[^\w.-]", "_", name) + ".fa")
+            with open(path, "wb") as out:
+                out.write(record)
+            files.append(path)
+        kept += 1
+    for f in shard_files:
+        f.close()
+    return files, kept
+
+
+def run_gmsn(gmsn, path):
+    """gmsn.pl --faa --fnn on one FASTA, in its directory (outputs are written next to it)."""
+    result = subprocess.run(["perl", os.path.abspath(gmsn), os.path.basename(path), "--faa", "--fnn"],
+                            cwd=os.path.dirname(os.path.abspath(path)), capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.stderr.write(f"[WARN] gmsn.pl failed on {path}: {result.stderr.strip()[-500:]}\n")
+    return result.returncode
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export TE/ERV candidate regions from an indexed FASTA and run gmsuite.")
+    parser.add_argument("fasta", help="Uncompressed (masked) FASTA (.fai built if missing)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--names", help="File with the record names to export, one per line (default: all records)")
+    source.add_argument("--gff", help="Repeat GFF; arrays of the same element are consolidated into regions")
+    parser.add_argument("--match", help="With --gff, keep only elements containing this string (e.g. Tgut716A)")
+    parser.add_argument("--merge-distance", type=int, default=0,
+                        help="With --gff, merge a unit starting before the previous end + this (as gff3Merger.py)")
+    parser.add_argument("--single-ns", action="store_true", help="Collapse runs of N (masked bases) to a single N")
+    parser.add_argument("--min-length", type=int, default=0, help="Minimum exported length (after --single-ns)")
+    parser.add_argument("--telo-distance", type=int, default=0,
+                        help="With --gff, exclude regions closer than this to the sequence ends")
+    parser.add_argument("--telo-fraction", type=float,
+                        help="Exclude regions with at least this fraction of (TTAGGG)n/(CCCTAA)n tracts")
+    parser.add_argument("--outdir", default="out", help="Output directory")
+    parser.add_argument("--shards", type=int, default=0, help="Write this many FASTAs instead of one per region")
+    parser.add_argument("--gmsn", help="Path to gmsn.pl; run on every exported FASTA")
+    parser.add_argument("-t", "--threads", type=int, default=1, help="Concurrent gmsn.pl runs")
+    args = parser.parse_args()
+
+    fasta = IndexedFasta(args.fasta)
+    if args.gff:
+        regions = merged_regions(args.gff, args.merge_distance, args.match)
+        regions = [r for r in regions if r[0] in fasta.index]
+    else:
+        names = None
+        if args.names:
+            with open(args.names) as f:
+                names = [line.strip().lstrip(">") for line in f if line.strip()]
+        regions = record_regions(fasta, names)
+
+    files, kept = export_regions(fasta, regions, args.outdir, args.shards, args.min_length, args.single_ns,
+                                 args.telo_distance, args.telo_fraction)
+    print(f"[INFO] Exported {kept} of {len(regions)} regions to {len(files)} FASTA files in {args.outdir}")
+
+    if args.gmsn:
+        # gmsn.pl runs as a subprocess, threads only wait on it
+        with ThreadPool(args.threads) as pool:
+            codes = pool.starmap(run_gmsn, [(args.gmsn, path) for path in files])
+        print(f"[INFO] gmsn.pl finished on {codes.count(0)} of {len(files)} files")
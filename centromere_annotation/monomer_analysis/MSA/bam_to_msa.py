@@ -1,61 +1,262 @@
+import os
+import re
 import sys
+import argparse
+from contextlib import nullcontext
+from multiprocessing import Pool
+import numpy as np
 import pysam
 from Bio import SeqIO
 
-bam_file = sys.argv[1]
-ref_fasta = sys.argv[2]
-output_fasta = sys.argv[3]
 
-# Load reference sequences
-ref_seqs = {rec.id: str(rec.seq) for rec in SeqIO.parse(ref_fasta, "fasta")}
+def project_read(read, width):
+    """Project a read onto reference coordinates as a gapped row of fixed width."""
+    row = bytearray(b'-' * width)
+    query_seq = read.query_sequence.encode()
+    q_pos = 0
+    r_pos = read.reference_start
 
-# Open BAM file
-bam = pysam.AlignmentFile(bam_file, "rb")
+    for op, length in read.cigartuples:
+        if op in (0, 7, 8):  # match/mismatch (M, =, X)
+            row[r_pos:r_pos + length] = query_seq[q_pos:q_pos + length]
+            q_pos += length
+            r_pos += length
+        elif op == 1:  # insertion to ref → skip
+            q_pos += length
+        elif op in (2, 3):  # deletion/skip from ref → already gaps
+            r_pos += length
+        elif op == 4:  # soft clip
+            q_pos += length
+        elif op == 5:  # hard clip → ignore
+            pass
 
-aligned_seqs = {}
+    return row
 
-# Parse alignments and store gapped sequences
-for read in bam.fetch(until_eof=True):
-    if read.is_unmapped:
-        continue
 
-    ref_name = bam.get_reference_name(read.reference_id)
-    ref_seq = ref_seqs[ref_name]
-    query_seq = read.query_sequence
+def insertion_columns(bam, region, width):
+    """First pass: count rows and find the longest insertion before each reference position.
 
-    ref_start = read.reference_start
-    q_pos = 0
-    r_pos = ref_start
-    q_aln = []
+    Returns the row count, the output column of every reference position (plus the end),
+    and the first column of the shared insertion block in front of it.
+    """
+    max_ins = np.zeros(width + 1, dtype=np.int64)
+    n_rows = 0
+    for read in fetch_reads(bam, region):
+        if read.is_unmapped:
+            continue
+        n_rows += 1
+        r_pos = read.reference_start
+        for op, length in read.cigartuples:
+            if op in (0, 2, 3, 7, 8):
+                r_pos += length
+            elif op == 1 and length > max_ins[r_pos]:
+                max_ins[r_pos] = length
+
+    ref_col = np.arange(width + 1) + np.cumsum(max_ins)
+    ins_col = ref_col - max_ins
+    return n_rows, ref_col, ins_col
 
-    # Add leading gaps if alignment doesn't start at position 0
-    if ref_start > 0:
-        q_aln.append('-' * ref_start)
+
+def project_read_insertions(read, ref_col, ins_col):
+    """Project a read onto the global column map, placing insertions in the shared gap columns."""
+    row = np.full(ref_col[-1], ord('-'), dtype=np.uint8)
+    query_seq = np.frombuffer(read.query_sequence.encode(), dtype=np.uint8)
+    q_pos = 0
+    r_pos = read.reference_start
 
     for op, length in read.cigartuples:
-        if op == 0:  # match/mismatch
-            q_aln.append(query_seq[q_pos:q_pos + length])
+        if op in (0, 7, 8):  # match/mismatch (M, =, X)
+            row[ref_col[r_pos:r_pos + length]] = query_seq[q_pos:q_pos + length]
             q_pos += length
             r_pos += length
-        elif op == 1:  # insertion to ref → skip
+        elif op == 1:  # insertion to ref → left-aligned in the insertion block
+            start = ins_col[r_pos]
+            row[start:start + length] = query_seq[q_pos:q_pos + length]
             q_pos += length
-        elif op == 2:  # deletion from ref → pad query with gaps
-            q_aln.append('-' * length)
+        elif op in (2, 3):  # deletion/skip from ref → already gaps
             r_pos += length
         elif op == 4:  # soft clip
             q_pos += length
-        elif op == 5:  # hard clip → ignore
-            pass
 
-    aligned_query = ''.join(q_aln)
-    aligned_seqs[read.query_name] = aligned_query
+    return row
+
+
+def msa_in_memory(bam_file, ref_fasta, output_fasta):
+    """Original mode: keep all gapped reads and pad to the longest one."""
+    # Load reference sequences
+    ref_seqs = {rec.id: str(rec.seq) for rec in SeqIO.parse(ref_fasta, "fasta")}
+
+    # Open BAM file
+    bam = pysam.AlignmentFile(bam_file, "rb")
+
+    aligned_seqs = {}
+
+    # Parse alignments and store gapped sequences
+    for read in bam.fetch(until_eof=True):
+        if read.is_unmapped:
+            continue
+
+        ref_name = bam.get_reference_name(read.reference_id)
+        ref_seq = ref_seqs[ref_name]
+        query_seq = read.query_sequence
+
+        ref_start = read.reference_start
+        q_pos = 0
+        r_pos = ref_start
+        q_aln = []
+
+        # Add leading gaps if alignment doesn't start at position 0
+        if ref_start > 0:
+            q_aln.append('-' * ref_start)
+
+        for op, length in read.cigartuples:
+            if op in (0, 7, 8):  # match/mismatch (M, =, X)
+                q_aln.append(query_seq[q_pos:q_pos + length])
+                q_pos += length
+                r_pos += length
+            elif op == 1:  # insertion to ref → skip
+                q_pos += length
+            elif op == 2:  # deletion from ref → pad query with gaps
+                q_aln.append('-' * length)
+                r_pos += length
+            elif op == 4:  # soft clip
+                q_pos += length
+            elif op == 5:  # hard clip → ignore
+                pass
+
+        aligned_query = ''.join(q_aln)
+        aligned_seqs[read.query_name] = aligned_query
+
+    # Find the max alignment length
+    max_len = max(len(seq) for seq in aligned_seqs.values())
+
+    # Write output with trailing padding
+    with open(output_fasta, "w") as out:
+        for name, seq in aligned_seqs.items():
+            padded_seq = seq.ljust(max_len, '-')  # pad with trailing '-'
+            out.write(f">{name}\n{padded_seq}\n")
+
+
+def fetch_reads(bam, region=None):
+    """Iterate the whole file, or only the given region through the BAM index."""
+    if region is None:
+        return bam.fetch(until_eof=True)
+    return bam.fetch(region=region)
+
+
+def msa_streaming(bam_file, output_fasta, matrix_file=None, region=None, insertions=False):
+    """Pad every read to the reference length from the BAM header and write rows as they come.
+
+    With insertions, a first pass builds a global column map so that inserted bases
+    are kept in shared gap columns instead of being dropped.
+    """
+    bam = pysam.AlignmentFile(bam_file, "rb")
+    if region is None:
+        width = max(bam.lengths)
+    else:
+        width = bam.get_reference_length(region.split(":")[0])
+
+    n_rows = None
+    if insertions:
+        n_rows, ref_col, ins_col = insertion_columns(bam, region, width)
+        width = int(ref_col[-1])
+    elif matrix_file:
+        # first pass only counts rows so the matrix can be preallocated on disk
+        n_rows = sum(1 for read in fetch_reads(bam, region) if not read.is_unmapped)
+    if n_rows is not None:
+        bam.close()
+        bam = pysam.AlignmentFile(bam_file, "rb")
+
+    matrix = None
+    if matrix_file:
+        matrix = np.lib.format.open_memmap(matrix_file, mode="w+", dtype=np.uint8, shape=(n_rows, width))
+
+    n = 0
+    with open(output_fasta, "w") as out, \
+            (open(matrix_file + ".names", "w") if matrix_file else nullcontext()) as names:
+        for read in fetch_reads(bam, region):
+            if read.is_unmapped:
+                continue
+            if insertions:
+                row = project_read_insertions(read, ref_col, ins_col)
+                out.write(f">{read.query_name}\n")
+                out.write(row.tobytes().decode())
+            else:
+                row = project_read(read, width)
+                out.write(f">{read.query_name}\n")
+                out.write(row.decode())
+            out.write("\n")
+            if matrix is not None:
+                matrix[n] = np.frombuffer(row, dtype=np.uint8)
+                names.write(f"{read.query_name}\n")
+            n += 1
+
+    if matrix is not None:
+        matrix.flush()
+
+    return n
+
+
+def read_regions(regions):
+    """Regions are given comma-separated on the command line or one per line in a file."""
+    if os.path.isfile(regions):
+        with open(regions) as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return [r for r in regions.split(",") if r]
+
+
+def region_path(path, region):
+    """Insert a filesystem-safe region tag before the file extension."""
+    tag = re.sub(r"[^A-Za-z0-9_.-]", "_", region)
+    base, ext = os.path.splitext(path)
+    return f"{base}.{tag}{ext}"
+
+
+def msa_regions(bam_file, regions, output_fasta, matrix_file=None, threads=1, insertions=False):
+    """Build one MSA per reference/region, fetching through the index in worker processes."""
+    with pysam.AlignmentFile(bam_file, "rb") as bam:
+        if not bam.has_index():
+            sys.exit(f"{bam_file} has no index, run samtools index first")
+
+    jobs = [(bam_file,
+             region_path(output_fasta, region),
+             region_path(matrix_file, region) if matrix_file else None,
+             region,
+             insertions) for region in regions]
+
+    with Pool(threads) as pool:
+        counts = pool.starmap(msa_streaming, jobs)
+
+    for (_, out, _, region, _), n in zip(jobs, counts):
+        print(f"{region}: {n} sequences written to {out}")
+
 
-# Find the max alignment length
-max_len = max(len(seq) for seq in aligned_seqs.values())
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert reads aligned to a reference monomer into a gapped MSA.")
+    parser.add_argument("bam", help="BAM file with reads aligned to the reference")
+    parser.add_argument("ref_fasta", nargs="?",
+                        help="Reference FASTA used for the alignment (only read by the default in-memory mode; "
+                             "may be omitted with --stream, --regions or --insertions, which use the BAM header)")
+    parser.add_argument("output_fasta", help="Output MSA in FASTA format")
+    parser.add_argument("--stream", action="store_true",
+                        help="Pad to the reference length from the BAM header and stream rows to the output (bounded memory)")
+    parser.add_argument("--matrix", help="With --stream, also write the MSA as a uint8 .npy matrix (row names in <matrix>.names)")
+    parser.add_argument("--regions",
+                        help="Comma-separated references/regions (or a file with one per line) fetched through the BAM index; "
+                             "one MSA is written per region, implies --stream")
+    parser.add_argument("--threads", type=int, default=1, help="Worker processes used with --regions")
+    parser.add_argument("--insertions", action="store_true",
+                        help="Keep inserted bases in shared gap columns (two passes over the BAM), implies --stream")
+    args = parser.parse_args()
 
-# Write output with trailing padding
-with open(output_fasta, "w") as out:
-    for name, seq in aligned_seqs.items():
-        padded_seq = seq.ljust(max_len, '-')  # pad with trailing '-'
-        out.write(f">{name}\n{padded_seq}\n")
+    if args.matrix and not (args.stream or args.regions or args.insertions):
+        sys.exit("--matrix requires --stream, --regions or --insertions")
 
+    if args.regions:
+        msa_regions(args.bam, read_regions(args.regions), args.output_fasta, args.matrix, args.threads, args.insertions)
+    elif args.stream or args.insertions:
+        msa_streaming(args.bam, args.output_fasta, args.matrix, insertions=args.insertions)
+    elif args.ref_fasta is None:
+        parser.error("ref_fasta is required without --stream, --regions or --insertions")
+    else:
+        msa_in_memory(args.bam, args.ref_fasta, args.output_fasta)
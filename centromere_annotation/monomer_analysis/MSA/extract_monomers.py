@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+from indexed_fasta import IndexedFasta, reverse_complement
+
+
+def read_monomers(gff_file, motif):
+    """Coordinates (chrom, 0-based start, end, strand) of every annotated copy of the motif."""
+    monomers = []
+    with open(gff_file) as f:
+        for line in f:
+            if line.startswith("#") or motif not in line:
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 9 or motif not in fields[8]:
+                continue
+            monomers.append((fields[0], int(fields[3]) - 1, int(fields[4]), fields[6]))
+    return monomers
+
+
+def kmers(seq, k):
+    return {seq[i:i + k] for i in range(len(seq) - k + 1)}
+
+
+def write_record(out, name, seq, width=60):
+    out.write(b">" + name + b"\n")
+    for i in range(0, len(seq), width):
+        out.write(seq[i:i + width])
+        out.write(b"\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract satellite monomers from a .fai-indexed genome, pick the modal-length "
+                    "representative and write all copies in the same orientation.")
+    parser.add_argument("--fasta", required=True, help="Uncompressed genome FASTA (.fai built if missing)")
+    parser.add_argument("--gff", required=True, help="RepeatMasker GFF with monomer units")
+    parser.add_argument("--motif", default="Tgut716A", help="Motif name to extract")
+    parser.add_argument("--out", required=True, help="Output FASTA with oriented monomers")
+    parser.add_argument("--ref-out", help="Also write the representative monomer (reference for minimap2)")
+    parser.add_argument("--kmer-check", action="store_true",
+                        help="Confirm the GFF strand of every copy by k-mer sharing with the representative")
+    parser.add_argument("-k", type=int, default=7, help="k-mer size used with --kmer-check")
+    args = parser.parse_args()
+
+    monomers = read_monomers(args.gff, args.motif)
+    if not monomers:
+        raise SystemExit(f"No {args.motif} units found in {args.gff}")
+
+    # Most common length, ties go to the longer length
+    lengths = Counter(end - start for _, start, end, _ in monomers)
+    modal_len = max(lengths, key=lambda l: (lengths[l], l))
+    print(f"{len(monomers)} {args.motif} units, modal length {modal_len} bp ({lengths[modal_len]} copies)")
+
+    genome = IndexedFasta(args.fasta)
+
+    def oriented(chrom, start, end, strand):
+        seq = genome.fetch(chrom, start, end)
+        return reverse_complement(seq) if strand == "-" else seq
+
+    rep = next(m for m in monomers if m[2] - m[1] == modal_len)
+    rep_seq = oriented(*rep)
+    rep_name = f"{rep[0]}:{rep[1]}-{rep[2]}({rep[3]})".encode()
+    if args.ref_out:
+        with open(args.ref_out, "wb") as out:
+            write_record(out, rep_name, rep_seq)
+        print(f"Representative {rep_name.decode()} written to {args.ref_out}")
+
+    if args.kmer_check:
+        rep_fwd = kmers(rep_seq.upper(), args.k)
+        rep_rev = kmers(reverse_complement(rep_seq.upper()), args.k)
+
+    flipped = 0
+    with open(args.out, "wb") as out:
+        for chrom, start, end, strand in monomers:
+            seq = oriented(chrom, start, end, strand)
+            if args.kmer_check:
+                seq_kmers = kmers(seq.upper(), args.k)
+                if len(seq_kmers & rep_rev) > len(seq_kmers & rep_fwd):
+                    seq = reverse_complement(seq)
+                    strand = "+" if strand == "-" else "-"
+                    flipped += 1
+            # bedtools getfasta -s style names, strand relative to the genome
+            write_record(out, f"{chrom}:{start}-{end}({strand})".encode(), seq)
+
+    genome.close()
+    if args.kmer_check:
+        print(f"{flipped} units flipped against their GFF strand by k-mer check")
+    print(f"Oriented monomers written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
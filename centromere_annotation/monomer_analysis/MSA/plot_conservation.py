@@ -7,28 +7,47 @@ alignment_file = sys.argv[1]
 output_plot = sys.argv[2]
 output_csv = sys.argv[3]
 
-# Load alignment
-alignment = AlignIO.read(alignment_file, "fasta")
-alignment_length = alignment.get_alignment_length()
-num_sequences = len(alignment)
-
 # Compute conservation and most common base
 conservation = []
 most_common_bases = []
 
-for i in range(alignment_length):
-    column = alignment[:, i]
-    counts = {}
-    for base in column:
-        counts[base] = counts.get(base, 0) + 1
-    most_common_base = max(counts, key=counts.get)
-    max_count = counts[most_common_base]
+if alignment_file.endswith(".npy"):
+    # Byte matrix written by bam_to_msa.py --matrix, counted column-wise
+    import numpy as np
+    matrix = np.load(alignment_file, mmap_mode="r")
+    num_sequences, alignment_length = matrix.shape
+    if num_sequences == 0:
+        sys.exit(f"{alignment_file} has no sequences")
+    symbols = np.unique(matrix)
+    counts = np.stack([(matrix == sym).sum(axis=0) for sym in symbols])
+    first_seen = np.stack([(matrix == sym).argmax(axis=0) for sym in symbols])
+    # ties go to the symbol seen first in the column, as in the FASTA path
+    best = (counts * (num_sequences + 1) - first_seen).argmax(axis=0)
+    for i in range(alignment_length):
+        most_common_base = chr(symbols[best[i]])
+        max_count = counts[best[i], i]
+        score = 0.0 if most_common_base == '-' else max_count / num_sequences
+        conservation.append(score)
+        most_common_bases.append(most_common_base)
+else:
+    # Load alignment
+    alignment = AlignIO.read(alignment_file, "fasta")
+    alignment_length = alignment.get_alignment_length()
+    num_sequences = len(alignment)
+
+    for i in range(alignment_length):
+        column = alignment[:, i]
+        counts = {}
+        for base in column:
+            counts[base] = counts.get(base, 0) + 1
+        most_common_base = max(counts, key=counts.get)
+        max_count = counts[most_common_base]
 
-    # Set conservation to 0 if the most common base is a gap
-    score = 0.0 if most_common_base == '-' else max_count / num_sequences
+        # Set conservation to 0 if the most common base is a gap
+        score = 0.0 if most_common_base == '-' else max_count / num_sequences
 
-    conservation.append(score)
-    most_common_bases.append(most_common_base)
+        conservation.append(score)
+        most_common_bases.append(most_common_base)
 
 # Write CSV: position, most common base, conservation score
 with open(output_csv, "w", newline="") as csvfile:
@@ -1,41 +1,124 @@
-import sys
+import argparse
 from Bio import SeqIO
 
-query_fasta = sys.argv[1]
-paf_file = sys.argv[2]
-aligned_output = sys.argv[3]          # e.g. output_oriented.fa
-unaligned_output = sys.argv[4]        # e.g. output_unaligned.fa
-
-# Step 1: Parse strand info from PAF
-strand_map = {}
-with open(paf_file) as f:
-    for line in f:
-        fields = line.strip().split('\t')
-        if len(fields) > 4:
+# IUPAC complement for reverse complementing raw FASTA bytes
+COMPLEMENT = bytes.maketrans(b"ACGTRYKMBVDHNacgtrykmbvdhn", b"TGCAYRMKVBHDNtgcayrmkvbhdn")
+
+
+def best_strands(paf_file):
+    """Strand of the best-scoring hit per query (AS:i tag, else number of matching bases)."""
+    best = {}
+    with open(paf_file) as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 10:
+                continue
+            score = int(fields[9])
+            for tag in fields[12:]:
+                if tag.startswith("AS:i:"):
+                    score = int(tag[5:])
+                    break
             qname = fields[0]
-            strand = fields[4]
-            if qname not in strand_map:
-                strand_map[qname] = strand  # take first valid alignment
-
-# Step 2: Process sequences
-aligned_seqs = []
-unaligned_seqs = []
-
-for rec in SeqIO.parse(query_fasta, "fasta"):
-    if rec.id in strand_map:
-        strand = strand_map[rec.id]
-        if strand == "-":
-            rec.seq = rec.seq.reverse_complement()
-            rec.id += "_revcomp"
-            rec.description += " (reverse complemented)"
-        aligned_seqs.append(rec)
-    else:
-        unaligned_seqs.append(rec)
+            if qname not in best or score > best[qname][0]:
+                best[qname] = (score, fields[4] == "-")
+    return {qname: minus for qname, (score, minus) in best.items()}
+
+
+def write_record(out, header, seq, width=60):
+    out.write(header)
+    for i in range(0, len(seq), width):
+        out.write(seq[i:i + width])
+        out.write(b"\n")
+
+
+def orient_streaming(query_fasta, paf_file, aligned_output, unaligned_output):
+    """Single pass over the FASTA, reverse complementing bytes and writing records as they are read."""
+    strand_map = best_strands(paf_file)
+    n_aligned = n_unaligned = 0
+
+    with open(query_fasta, "rb") as fin, open(aligned_output, "wb") as aligned, \
+            open(unaligned_output, "wb") as unaligned:
+
+        def flush(header, chunks):
+            nonlocal n_aligned, n_unaligned
+            description = header[1:].strip()
+            name = description.split(None, 1)[0].decode()
+            seq = b"".join(chunks)
+            if name not in strand_map:
+                write_record(unaligned, b">" + description + b"\n", seq)
+                n_unaligned += 1
+                return
+            if strand_map[name]:
+                seq = seq.translate(COMPLEMENT)[::-1]
+                # same header Biopython writes for the renamed record
+                description = name.encode() + b"_revcomp " + description + b" (reverse complemented)"
+            write_record(aligned, b">" + description + b"\n", seq)
+            n_aligned += 1
+
+        header = None
+        chunks = []
+        for line in fin:
+            if line.startswith(b">"):
+                if header is not None:
+                    flush(header, chunks)
+                header = line
+                chunks = []
+            else:
+                chunks.append(line.strip())
+        if header is not None:
+            flush(header, chunks)
 
-# Step 3: Write output
-SeqIO.write(aligned_seqs, aligned_output, "fasta")
-SeqIO.write(unaligned_seqs, unaligned_output, "fasta")
+    return n_aligned, n_unaligned
 
-print(f"✓ {len(aligned_seqs)} sequences written to {aligned_output}")
-print(f"✓ {len(unaligned_seqs)} sequences written to {unaligned_output}")
 
+def orient_in_memory(query_fasta, paf_file, aligned_output, unaligned_output):
+    # Step 1: Parse strand info from PAF
+    strand_map = {}
+    with open(paf_file) as f:
+        for line in f:
+            fields = line.strip().split('\t')
+            if len(fields) > 4:
+                qname = fields[0]
+                strand = fields[4]
+                if qname not in strand_map:
+                    strand_map[qname] = strand  # take first valid alignment
+
+    # Step 2: Process sequences
+    aligned_seqs = []
+    unaligned_seqs = []
+
+    for rec in SeqIO.parse(query_fasta, "fasta"):
+        if rec.id in strand_map:
+            strand = strand_map[rec.id]
+            if strand == "-":
+                rec.seq = rec.seq.reverse_complement()
+                rec.id += "_revcomp"
+                rec.description += " (reverse complemented)"
+            aligned_seqs.append(rec)
+        else:
+            unaligned_seqs.append(rec)
+
+    # Step 3: Write output
+    SeqIO.write(aligned_seqs, aligned_output, "fasta")
+    SeqIO.write(unaligned_seqs, unaligned_output, "fasta")
+
+    return len(aligned_seqs), len(unaligned_seqs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reorient sequences relative to a reference using PAF strands.")
+    parser.add_argument("query_fasta", help="Sequences to orient")
+    parser.add_argument("paf", help="Alignments of the sequences to the reference")
+    parser.add_argument("aligned_output", help="e.g. output_oriented.fa")
+    parser.add_argument("unaligned_output", help="e.g. output_unaligned.fa")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream the FASTA once and orient by the best-scoring hit per sequence")
+    args = parser.parse_args()
+
+    if args.stream:
+        n_aligned, n_unaligned = orient_streaming(args.query_fasta, args.paf, args.aligned_output, args.unaligned_output)
+    else:
+        n_aligned, n_unaligned = orient_in_memory(args.query_fasta, args.paf, args.aligned_output, args.unaligned_output)
+
+    print(f"✓ {n_aligned} sequences written to {args.aligned_output}")
+    print(f"✓ {n_unaligned} sequences written to {args.unaligned_output}")
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Extract transcript, CDS and protein sequences of selected genes from a GTF and an indexed genome.
+
+The GTF is indexed once (<gtf>.genes.idx): every gene ID and gene name points to the byte
+ranges of its lines, so looking up a gene only reads those lines. Transcripts (exons) and
+CDS are spliced from the memory-mapped genome through its .fai index (built if missing),
+reverse complemented on the minus strand and translated, with the same output as
+gffread -w/-x/-y (stop codons as '.'). Gene lines are ignored, so the NCBI
+missing-transcript-ID issue does not apply.
+
+Usage:
+  python extract_proteins.py bTaeGut7.mat+Z.cur.20250313.EGAPx.v0.1.gtf bTaeGut7.mat+Z.cur.20250313.fasta CENPC CENPA -o kinetochore
+"""
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from indexed_fasta import IndexedFasta, reverse_complement
+
+ATTR_RE = re.compile(r'(\S+) "([^"]*)"')
+NAME_ATTRS = ("gene_id", "gene_name", "gene")
+
+BASES = "TCAG"
+AMINO_ACIDS = "FFLLSSSSYY..CC.WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG"
+CODONS = {a + b + c: AMINO_ACIDS[16 * i + 4 * j + k]
+          for i, a in enumerate(BASES) for j, b in enumerate(BASES) for k, c in enumerate(BASES)}
+
+
+def translate(seq):
+    seq = seq.upper()
+    return "".join(CODONS.get(seq[i:i + 3], "X") for i in range(0, len(seq) - 2, 3))
+
+
+def build_gene_index(gtf, idx_path):
+    """One pass over the GTF: byte ranges (merged over consecutive lines) and names of every gene."""
+    ranges, names = {}, {}
+    with open(gtf, "rb") as f:
+        pos = 0
+        for line in f:
+            start, pos = pos, pos + len(line)
+            if line.startswith(b"#"):
+                continue
+            p = line.rstrip(b"\r\n").split(b"\t")
+            if len(p) < 9:
+                continue
+            attrs = dict(ATTR_RE.findall(p[8].decode()))
+            gene_id = attrs.get("gene_id")
+            if gene_id is None:
+                continue
+            gene_ranges = ranges.setdefault(gene_id, [])
+            if gene_ranges and gene_ranges[-1][1] == start:
+                gene_ranges[-1][1] = pos
+            else:
+                gene_ranges.append([start, pos])
+            gene_names = names.setdefault(gene_id, set())
+            gene_names.update(attrs[a] for a in NAME_ATTRS[1:] if a in attrs)
+
+    st = os.stat(gtf)
+    with open(idx_path + ".tmp", "w") as out:
+        out.write(f"#size={st.st_size}\tmtime_ns={st.st_mtime_ns}\n")
+        for gene_id, gene_ranges in ranges.items():
+            names_field = ",".join(sorted(names[gene_id] - {gene_id})) or "."
+            ranges_field = ",".join(f"{s}-{e}" for s, e in gene_ranges)
+            out.write(f"{gene_id}\t{names_field}\t{ranges_field}\n")
+    os.replace(idx_path + ".tmp", idx_path)
+
+
+class GeneIndex:
+    """Gene ID/name -> GTF byte ranges, built on first use and rebuilt when the GTF changes."""
+
+    def __init__(self, gtf):
+        self.gtf = gtf
+        idx_path = gtf + ".genes.idx"
+        st = os.stat(gtf)
+        stamp = f"#size={st.st_size}\tmtime_ns={st.st_mtime_ns}\n"
+        saved = None
+        if os.path.exists(idx_path):
+            with open(idx_path) as fh:
+                saved = fh.readline()
+        if saved != stamp:
+            sys.stderr.write(f"[INFO] Indexing {gtf}\n")
+            build_gene_index(gtf, idx_path)
+        self.ranges, self.keys = {}, {}
+        with open(idx_path) as f:
+            next(f)
+            for line in f:
+                gene_id, names, ranges = line.rstrip("\n").split("\t")
+                self.ranges[gene_id] = [tuple(map(int, r.split("-"))) for r in ranges.split(",")]
+                self.keys.setdefault(gene_id, gene_id)
+                if names != ".":
+                    for name in names.split(","):
+                        self.keys.setdefault(name, gene_id)
+
+    def lines(self, key):
+        """GTF lines of one gene (by ID or name), or None if unknown."""
+        gene_id = self.keys.get(key)
+        if gene_id is None:
+            return None
+        lines = []
+        with open(self.gtf, "rb") as f:
+            for start, end in self.ranges[gene_id]:
+                f.seek(start)
+                lines.extend(f.read(end - start).decode().splitlines())
+        return lines
+
+
+def transcripts(lines):
+    """Transcript ID -> chrom, strand, gene, exons and CDS (0-based half-open, genomic order)."""
+    models = {}
+    for line in lines:
+        p = line.split("\t")
+        if len(p) < 9 or p[2] not in ("transcript", "exon", "CDS"):
+            continue
+        attrs = dict(ATTR_RE.findall(p[8]))
+        tid = attrs.get("transcript_id")
+        if not tid:
+            continue
+        m = models.setdefault(tid, {"chrom": p[0], "strand": p[6], "gene": attrs.get("gene_id"),
+                                    "span": None, "exon": [], "CDS": []})
+        start, end = int(p[3]) - 1, int(p[4])
+        if p[2] == "transcript":
+            m["span"] = (start, end)
+        elif p[2] == "CDS":
+            m["CDS"].append((start, end, int(p[7]) if p[7].isdigit() else 0))
+        else:
+            m["exon"].append((start, end, 0))
+    for m in models.values():
+        m["exon"].sort()
+        m["CDS"].sort()
+        if not m["exon"] and m["span"]:
+            m["exon"] = [(m["span"][0], m["span"][1], 0)]
+    return models
+
+
+def splice(genome, chrom, strand, segments):
+    seq = b"".join(genome.fetch(chrom, s, e) for s, e, _ in segments)
+    if strand == "-":
+        seq = reverse_complement(seq)
+    return seq.decode()
+
+
+def extract(gene_index, genome, genes):
+    """(transcript records, CDS records, protein records) as (header, sequence) for the genes."""
+    out = {"transcript": [], "cds": [], "protein": []}
+    for gene in genes:
+        lines = gene_index.lines(gene)
+        if lines is None:
+            sys.stderr.write(f"[WARN] {gene} not found in {gene_index.gtf}\n")
+            continue
+        for tid, m in transcripts(lines).items():
+            header = f"{tid} gene={m['gene']} loc:{m['chrom']}({m['strand']})"
+            if m["exon"]:
+                out["transcript"].append((header, splice(genome, m["chrom"], m["strand"], m["exon"])))
+            if m["CDS"]:
+                cds = splice(genome, m["chrom"], m["strand"], m["CDS"])
+                # phase of the first CDS in transcript orientation
+                phase = (m["CDS"][0] if m["strand"] == "+" else m["CDS"][-1])[2]
+                out["cds"].append((header, cds))
+                out["protein"].append((header, translate(cds[phase:])))
+    return out
+
+
+def write_fasta(records, path, width=70):
+    with open(path, "w") as out:
+        for header, seq in records:
+            out.write(f">{header}\n")
+            for i in range(0, len(seq), width):
+                out.write(seq[i:i + width] + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Transcript, CDS and protein sequences of genes from an indexed GTF and genome (as gffread -w/-x/-y).")
+    parser.add_argument("gtf", help="Annotation GTF (indexed as <gtf>.genes.idx on first use)")
+    parser.add_argument("genome", help="Uncompressed genome FASTA (.fai built if missing)")
+    parser.add_argument("genes", nargs="*", help="Gene IDs or names (e.g. CENPC)")
+    parser.add_argument("-l", "--list", help="File with one gene ID or name per line")
+    parser.add_argument("-o", "--prefix", help="Output prefix (default: the genes joined by _)")
+    args = parser.parse_args()
+
+    genes = list(args.genes)
+    if args.list:
+        with open(args.list) as f:
+            genes += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if not genes:
+        parser.error("no genes given")
+    prefix = args.prefix or "_".join(genes)
+
+    with IndexedFasta(args.genome) as genome:
+        records = extract(GeneIndex(args.gtf), genome, genes)
+    for kind, records_kind in records.items():
+        write_fasta(records_kind, f"{prefix}.{kind}.fa")
+    print(f"[INFO] {len(records['transcript'])} transcripts and {len(records['protein'])} proteins "
+          f"saved to {prefix}.{{transcript,cds,protein}}.fa")
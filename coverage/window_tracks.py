@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+Windowed alignment tracks in a single pass.
+
+Replaces the repeated awk | java -jar pafTo*Wig.jar passes of collect_summary.sh:
+read length, MQ and identity (min/avg/med/max), coverage, clipped reads and the
+strand fraction are accumulated together for all alignments and for each strand,
+and all WIG files are written at the end with the same names as collect_summary.sh.
+
+Medians are taken from per-window histograms with a fixed number of bins (bounded
+memory), so they are approximate to the bin width; min/avg/max are exact. These stat
+arrays are only allocated with --full; coverage, clipping and strand need none of them.
+
+Alignments are read from a PAF, or directly from a BAM with pysam (no SAM->PAF
+conversion; identity from NM, or MD when NM is missing, as paftools.js sam2paf).
+
+Usage:
+  python window_tracks.py paf in.paf out_prefix name [--full] [--span 1024]
+  python window_tracks.py bam in.bam out_prefix name [--full] [--threads 8]
+  python window_tracks.py bams bams/*.sort.bam out_prefix name [--partials partials/] [--threads 8]
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+from multiprocessing import Pool, get_context
+
+import numpy as np
+
+STATS = ("len", "mq", "idy")
+STRANDS = ("all", "p", "n")
+HIST_MAX = np.iinfo(np.uint16).max
+
+# Histogram binning per stat: read length on a log2 scale between 512 bp and 2 Mbp, MQ linear
+# over 0-MQ_MAX (exact with at least MQ_MAX + 1 bins; 255 = missing falls into the last bin),
+# identity linear between IDY_MIN and 100%
+LEN_LOG2_MIN = 9
+LEN_LOG2_MAX = 21
+MQ_MAX = 60
+IDY_MIN = 80.0
+
+
+def stat_bins(stat, values, n_bins):
+    if stat == "len":
+        b = np.floor((np.log2(np.maximum(values, 1)) - LEN_LOG2_MIN) * n_bins / (LEN_LOG2_MAX - LEN_LOG2_MIN))
+    elif stat == "mq":
+        b = np.floor(values * n_bins / (MQ_MAX + 1))
+    else:
+        b = np.floor((values - IDY_MIN) * n_bins / (100.0 - IDY_MIN))
+    return np.clip(b, 0, n_bins - 1).astype(np.int64)
+
+
+def bin_centers(stat, n_bins):
+    b = np.arange(n_bins, dtype=np.float64)
+    if stat == "len":
+        return 2 ** (LEN_LOG2_MIN + (b + 0.5) * (LEN_LOG2_MAX - LEN_LOG2_MIN) / n_bins)
+    if stat == "mq":
+        # midpoint of the integer MQs in the bin (the MQ itself when bins are at most 1 wide)
+        width = (MQ_MAX + 1) / n_bins
+        lo, hi = np.ceil(b * width), np.ceil((b + 1) * width) - 1
+        return (lo + np.maximum(hi, lo)) / 2
+    return IDY_MIN + (b + 0.5) * (100.0 - IDY_MIN) / n_bins
+
+
+class WindowTracks:
+    """Per-contig window arrays for all tracks, indexed [strand, window] or [stat, strand, window].
+
+    The read length/MQ/identity arrays (min, max, sum and the median histograms) are only
+    kept with stats=True.
+    """
+
+    def __init__(self, span=1024, median_bins=64, min_clipped=100, stats=True):
+        self.span = span
+        self.median_bins = median_bins
+        self.min_clipped = min_clipped
+        self.stats = stats
+        self.contigs = {}
+
+    def params(self):
+        return self.span, self.median_bins, self.min_clipped, self.stats
+
+    def contig(self, name, length):
+        if name not in self.contigs:
+            # same number of windows as the jars: length // span + 1
+            n = length // self.span + 1
+            self.contigs[name] = {
+                "length": np.int64(length),
+                "touch": np.zeros((3, n), dtype=np.int64),    # alignments overlapping the window
+                "cov": np.zeros((3, n), dtype=np.float64),    # window-normalized coverage
+                "clip": np.zeros((3, n), dtype=np.int64),     # clipped alignment ends
+            }
+            if self.stats:
+                self.contigs[name].update({
+                    "min": np.full((3, 3, n), np.inf),
+                    "max": np.full((3, 3, n), -np.inf),
+                    "sum": np.zeros((3, 3, n), dtype=np.float64),
+                    "hist": np.zeros((3, 3, n, self.median_bins), dtype=np.uint16),
+                })
+        return self.contigs[name]
+
+    def add(self, name, length, t_start, t_end, q_start, q_end, q_len, positive, mq, idy):
+        """Add a batch of alignments to one contig (all arguments but name/length are arrays)."""
+        c = self.contig(name, length)
+        span = self.span
+        n_win = c["touch"].shape[1]
+
+        # expand every alignment to the windows it touches (both ends inclusive, as the jars)
+        first = t_start // span
+        last = np.minimum(t_end // span, n_win - 1)
+        n_per = last - first + 1
+        rec = np.repeat(np.arange(len(first)), n_per)
+        win = first[rec] + (np.arange(len(rec)) - np.repeat(np.cumsum(n_per) - n_per, n_per))
+
+        w_start = win * span
+        w_end = np.minimum(w_start + span, length)
+        ts, te = t_start[rec], t_end[rec]
+        partial = (ts > w_start) | (te < w_end)
+        cov = np.where(partial, (np.minimum(te, w_end) - np.maximum(ts, w_start)) / span, 1.0)
+
+        # clipped read ends, at the window of the clipped end in reference orientation
+        start_key = np.where(positive, t_start // span, t_end // span)
+        end_key = np.where(positive, t_end // span, t_start // span)
+        start_clipped = q_start > self.min_clipped
+        end_clipped = (q_len - q_end) > self.min_clipped
+
+        if self.stats:
+            values = {"len": q_len.astype(np.float64), "mq": mq.astype(np.float64), "idy": idy}
+            bins = {stat: stat_bins(stat, values[stat], self.median_bins) for stat in STATS}
+
+        for s, strand_mask in enumerate((None, positive, ~positive)):
+            if strand_mask is None:
+                sel_win, sel_rec, sel_cov = win, rec, cov
+                sk, ek = start_key[start_clipped], end_key[end_clipped]
+            else:
+                m = strand_mask[rec]
+                sel_win, sel_rec, sel_cov = win[m], rec[m], cov[m]
+                sk = start_key[start_clipped & strand_mask]
+                ek = end_key[end_clipped & strand_mask]
+
+            c["touch"][s] += np.bincount(sel_win, minlength=n_win)
+            c["cov"][s] += np.bincount(sel_win, weights=sel_cov, minlength=n_win)
+            c["clip"][s] += np.bincount(np.minimum(np.concatenate([sk, ek]), n_win - 1), minlength=n_win)
+            if not self.stats:
+                continue
+
+            for k, stat in enumerate(STATS):
+                v = values[stat][sel_rec]
+                c["sum"][k, s] += np.bincount(sel_win, weights=v, minlength=n_win)
+                np.minimum.at(c["min"][k, s], sel_win, v)
+                np.maximum.at(c["max"][k, s], sel_win, v)
+                flat_idx, counts = np.unique(sel_win * self.median_bins + bins[stat][sel_rec], return_counts=True)
+                hist = c["hist"][k, s].reshape(-1)
+                hist[flat_idx] = np.minimum(hist[flat_idx].astype(np.int64) + counts, HIST_MAX)
+
+    def merge(self, name, other):
+        """Add the arrays of one contig collected separately (same span and bins)."""
+        if name not in self.contigs:
+            self.contigs[name] = other
+            return
+        c = self.contigs[name]
+        for key in ("touch", "cov", "clip"):
+            c[key] += other[key]
+        if not self.stats:
+            return
+        c["sum"] += other["sum"]
+        np.minimum(c["min"], other["min"], out=c["min"])
+        np.maximum(c["max"], other["max"], out=c["max"])
+        c["hist"] = np.minimum(c["hist"].astype(np.int64) + other["hist"], HIST_MAX).astype(np.uint16)
+
+    def save(self, path, **meta):
+        """Window arrays of all contigs (and meta values) as a compressed .npz."""
+        arrays = {f"{name}/{key}": value for name, c in self.contigs.items() for key, value in c.items()}
+        arrays.update({f"_{key}": np.array(value) for key, value in meta.items()})
+        arrays.update(_span=np.int64(self.span), _median_bins=np.int64(self.median_bins),
+                      _min_clipped=np.int64(self.min_clipped), _stats=np.int64(self.stats))
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        """Merge the arrays saved by save() (same span and bins) and return its meta values."""
+        with np.load(path) as f:
+            contigs, meta = {}, {}
+            for key in f.files:
+                if key.startswith("_"):
+                    meta[key[1:]] = f[key][()]
+                else:
+                    name, field = key.rsplit("/", 1)
+                    contigs.setdefault(name, {})[field] = f[key]
+        for name, c in contigs.items():
+            self.merge(name, c)
+        return meta
+
+    def median(self, c, k, s):
+        """Upper median per window from the histogram, clamped to the exact min/max."""
+        hist = c["hist"][k, s].astype(np.int64)
+        n = hist.sum(axis=1)
+        cum = np.cumsum(hist, axis=1)
+        b = (cum <= (n // 2)[:, None]).sum(axis=1)
+        med = bin_centers(STATS[k], self.median_bins)[np.minimum(b, self.median_bins - 1)]
+        return np.clip(med, c["min"][k, s], c["max"][k, s])
+
+    def values(self, c, kind, stat, strand):
+        """Window values of one track on one contig, and the windows written as -1 (or None)."""
+        s = STRANDS.index(strand)
+        n = c["touch"][s]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if kind in ("min", "avg", "med", "max"):
+                k = STATS.index(stat)
+                if kind == "avg":
+                    return c["sum"][k, s] / n, n == 0
+                if kind == "med":
+                    return self.median(c, k, s), n == 0
+                return c[kind][k, s], n == 0
+            if kind == "cov":
+                return c["cov"][s], None
+            if kind == "clip_abs":
+                return c["clip"][s], None
+            if kind == "clip_norm":
+                return 100.0 * c["clip"][s] / n, c["cov"][s] == 0
+            # strand: fraction of alignments on the + strand
+            return c["touch"][1] / c["touch"][0], c["touch"][0] == 0
+
+    def summary_tracks(self, prefix, name, full=False):
+        """(path without extension, track name, kind, stat, strand) of every output of collect_summary.sh."""
+        specs = []
+
+        def stat_tracks(out, title, stat, strand):
+            # as written by pafToMinAvgMedMaxWig.jar
+            for kind in ("min", "avg", "med", "max"):
+                specs.append((f"{out}.{kind}", f"{title} {kind.capitalize()}", kind, stat, strand))
+
+        def coverage_tracks(out, title, strand):
+            # as written by pafToCovClippedWig.jar
+            specs.append((f"{out}.cov", f"{title} Cov", "cov", None, strand))
+            specs.append((f"{out}.clip_norm", f"{title} Clipped (%)", "clip_norm", None, strand))
+            specs.append((f"{out}.clip_abs", f"{title} Clipped", "clip_abs", None, strand))
+
+        if full:
+            for stat, label in zip(STATS, ("Len", "MQ", "Idy")):
+                stat_tracks(f"{prefix}.{stat}", f"{name} {label}", stat, "all")
+            specs.append((f"{prefix}.strand", f"{name} +/all", "strand", None, "all"))
+            for strand, sign in (("p", "+"), ("n", "-")):
+                for stat, label, out in zip(STATS, ("Len", "MQ", "Idy"), ("readLen", "mq", "idy")):
+                    stat_tracks(f"{prefix}.{out}.{strand}", f"{name} {label} ({sign})", stat, strand)
+                coverage_tracks(f"{prefix}.{strand}", f"{name} ({sign})", strand)
+        coverage_tracks(prefix, name, "all")
+        return specs
+
+    def write_wig(self, path, title, kind, stat, strand):
+        with open(path + ".wig", "w") as out:
+            out.write(f'track type="wiggle_0" name="{title}"\n')
+            for chrom in sorted(self.contigs):
+                out.write(f"fixedStep chrom={chrom} start=1 step={self.span} span={self.span}\n")
+                values, empty = self.values(self.contigs[chrom], kind, stat, strand)
+                if kind == "clip_abs":
+                    out.write("\n".join(map(str, values.tolist())) + "\n")
+                else:
+                    write_column(out, values, empty)
+
+    def write_bigwig(self, path, title, kind, stat, strand):
+        """Same values as the WIG, clipped to the contig ends (as wigToBigWig -clip), with zoom levels."""
+        import pyBigWig
+        chroms = sorted(self.contigs)
+        bw = pyBigWig.open(path + ".bw", "w")
+        bw.addHeader([(chrom, int(self.contigs[chrom]["length"])) for chrom in chroms], maxZooms=10)
+        for chrom in chroms:
+            c = self.contigs[chrom]
+            length = int(c["length"])
+            n = -(-length // self.span)
+            if n == 0:
+                continue
+            values, empty = self.values(c, kind, stat, strand)
+            values = values.astype(np.float64)
+            if empty is not None:
+                values = np.where(empty, -1.0, values)
+            if n > 1:
+                bw.addEntries(chrom, 0, values=values[:n - 1], span=self.span, step=self.span)
+            bw.addEntries([chrom], [(n - 1) * self.span], ends=[length], values=[float(values[n - 1])])
+        bw.close()
+
+    def write_summary(self, prefix, name, full=False, bigwig=False, threads=1):
+        """All tracks of collect_summary.sh (coverage only, or everything with full), as WIG or BigWig."""
+        specs = self.summary_tracks(prefix, name, full)
+        if threads > 1:
+            # forked workers share the arrays, one output file each
+            global _SUMMARY
+            _SUMMARY = (self, specs, bigwig)
+            with get_context("fork").Pool(threads) as pool:
+                pool.map(_write_summary_track, range(len(specs)))
+            _SUMMARY = None
+            return
+        for spec in specs:
+            (self.write_bigwig if bigwig else self.write_wig)(*spec)
+
+
+_SUMMARY = None
+
+
+def _write_summary_track(i):
+    tracks, specs, bigwig = _SUMMARY
+    (tracks.write_bigwig if bigwig else tracks.write_wig)(*specs[i])
+
+
+def write_column(out, values, empty=None):
+    text = np.char.mod("%.2f", values)
+    if empty is not None:
+        text = np.where(empty, "-1", text)
+    out.write("\n".join(text.tolist()))
+    out.write("\n")
+
+
+def read_paf(tracks, paf_file, chunk_size=200_000):
+    """Stream the PAF once, feeding the tracks in per-contig batches."""
+    def flush(batch):
+        for chrom, rows in batch.items():
+            a = np.array(rows, dtype=np.int64)
+            idy = 100.0 * a[:, 7] / a[:, 8]
+            tracks.add(chrom, int(a[0, 0]), a[:, 1], a[:, 2], a[:, 3], a[:, 4], a[:, 5], a[:, 6] == 1, a[:, 9], idy)
+
+    batch = {}
+    n = 0
+    with (sys.stdin if paf_file == "-" else open(paf_file)) as f:
+        for line in f:
+            p = line.split("\t", 12)
+            if len(p) < 12:
+                continue
+            # t_len, t_start, t_end, q_start, q_end, q_len, positive, matches, block_len, mq
+            batch.setdefault(p[5], []).append(
+                (int(p[6]), int(p[7]), int(p[8]), int(p[2]), int(p[3]), int(p[1]),
+                 p[4] == "+", int(p[9]), int(p[10]), int(p[11])))
+            n += 1
+            if n % chunk_size == 0:
+                flush(batch)
+                batch = {}
+    flush(batch)
+    return n
+
+
+# BAM flags skipped, as samtools view -F0x104: unmapped and secondary
+SKIP_FLAGS = 0x104
+MD_MISMATCH_RE = re.compile(r"[A-Z]")
+
+
+def bam_fields(read):
+    """The PAF columns the tracks use, from one BAM record (query coordinates on the read strand)."""
+    cigar = read.cigartuples
+    blen = n_gap = 0
+    for op, n in cigar:
+        if op in (0, 7, 8):      # M, =, X
+            blen += n
+        elif op in (1, 2):       # I, D
+            blen += n
+            n_gap += n
+    if read.has_tag("NM"):
+        nm = read.get_tag("NM")
+    elif read.has_tag("MD"):
+        # mismatches (deleted bases follow ^ and are counted as gaps already)
+        nm = len(MD_MISMATCH_RE.findall(re.sub(r"\^[A-Z]+", "", read.get_tag("MD")))) + n_gap
+    else:
+        nm = 0
+    left = cigar[0][1] if cigar[0][0] in (4, 5) else 0
+    right = cigar[-1][1] if cigar[-1][0] in (4, 5) else 0
+    q_len = read.infer_read_length()
+    if read.is_reverse:
+        left, right = right, left
+    # t_start, t_end, q_start, q_end, q_len, positive, matches, block_len, mq
+    return (read.reference_start, read.reference_end, left, q_len - right, q_len,
+            not read.is_reverse, blen - nm, blen, read.mapping_quality)
+
+
+def read_bam(tracks, bam_file, contig=None, chunk_size=200_000):
+    """Feed the tracks from a BAM (one contig through the index, or the whole file)."""
+    import pysam
+
+    def flush(chrom, rows):
+        a = np.array(rows, dtype=np.int64)
+        idy = 100.0 * a[:, 6] / np.maximum(a[:, 7], 1)
+        tracks.add(chrom, lengths[chrom], a[:, 0], a[:, 1], a[:, 2], a[:, 3], a[:, 4], a[:, 5] == 1, a[:, 8], idy)
+
+    n = 0
+    with pysam.AlignmentFile(bam_file, "rb") as bam:
+        lengths = dict(zip(bam.references, bam.lengths))
+        reads = bam.fetch(contig) if contig else bam.fetch(until_eof=True)
+        chrom, rows = None, []
+        for read in reads:
+            if read.flag & SKIP_FLAGS or read.cigartuples is None:
+                continue
+            if read.reference_name != chrom or len(rows) == chunk_size:
+                if rows:
+                    flush(chrom, rows)
+                chrom, rows = read.reference_name, []
+            rows.append(bam_fields(read))
+            n += 1
+        if rows:
+            flush(chrom, rows)
+    return n
+
+
+def _scan_bam_contig(bam_file, contig, params):
+    tracks = WindowTracks(*params)
+    n = read_bam(tracks, bam_file, contig)
+    return contig, tracks.contigs.get(contig), n
+
+
+def collect_bam(tracks, bam_file, threads=1):
+    """All alignments of an indexed BAM, one contig per worker."""
+    import pysam
+    if threads <= 1:
+        return read_bam(tracks, bam_file)
+    with pysam.AlignmentFile(bam_file, "rb") as bam:
+        contigs = [s.contig for s in bam.get_index_statistics() if s.mapped]
+    jobs = [(bam_file, c, tracks.params()) for c in contigs]
+    n = 0
+    with Pool(threads) as pool:
+        for contig, arrays, count in pool.starmap(_scan_bam_contig, jobs):
+            if arrays is not None:
+                tracks.merge(contig, arrays)
+            n += count
+    return n
+
+
+def _scan_bam_partial(bam_file, params, partial):
+    """Tracks of one whole BAM, saved as a partial (with the BAM size and mtime) when a path is given."""
+    tracks = WindowTracks(*params)
+    n = read_bam(tracks, bam_file)
+    if partial is None:
+        return tracks.contigs, n
+    st = os.stat(bam_file)
+    tracks.save(partial, size=st.st_size, mtime_ns=st.st_mtime_ns, n=n)
+    return None, n
+
+
+def partial_is_fresh(partial, bam_file, tracks):
+    """A saved partial is reused while the BAM size and mtime and the track parameters are unchanged."""
+    if not os.path.exists(partial):
+        return False
+    st = os.stat(bam_file)
+    with np.load(partial) as f:
+        saved = tuple(int(f[key]) for key in ("_size", "_mtime_ns", "_span", "_median_bins", "_min_clipped"))
+        # partials saved before the stat arrays were optional always have them
+        saved += (bool(f["_stats"]) if "_stats" in f.files else True,)
+    return saved == (st.st_size, st.st_mtime_ns) + tracks.params()
+
+
+def collect_bams(tracks, bam_files, partial_dir=None, threads=1):
+    """Sum of the tracks of several BAMs (e.g. the per-task BAMs of winnowmap_array.sh), one BAM per worker.
+
+    With partial_dir, each BAM's arrays are kept as <partial_dir>/<bam>.<path hash>.tracks.npz, so adding
+    a sequencing run only scans the new BAM. BAMs listed more than once are only counted once.
+    """
+    if partial_dir:
+        os.makedirs(partial_dir, exist_ok=True)
+    unique = list(dict.fromkeys(os.path.realpath(b) for b in bam_files))
+    if len(unique) < len(bam_files):
+        sys.stderr.write(f"Skipping {len(bam_files) - len(unique)} BAMs listed more than once\n")
+    jobs = []
+    for bam_file in unique:
+        partial = None
+        if partial_dir:
+            # same-named BAMs of different runs (run1/x.bam, run2/x.bam) get their own partial
+            key = hashlib.sha1(bam_file.encode()).hexdigest()[:12]
+            partial = os.path.join(partial_dir, f"{os.path.basename(bam_file)}.{key}.tracks.npz")
+        jobs.append((bam_file, tracks.params(), partial))
+    todo = [job for job in jobs if job[-1] is None or not partial_is_fresh(job[-1], job[0], tracks)]
+    sys.stderr.write(f"Scanning {len(todo)} of {len(jobs)} BAMs\n")
+
+    n = 0
+    if todo:
+        with Pool(min(threads, len(todo))) as pool:
+            for contigs, count in pool.starmap(_scan_bam_partial, todo):
+                if contigs is not None:
+                    for name, c in contigs.items():
+                        tracks.merge(name, c)
+                    n += count
+
+    # saved partials are reduced one at a time
+    for job in jobs:
+        if job[-1] is not None:
+            n += int(tracks.load(job[-1])["n"])
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Windowed read length, MQ, identity, coverage, clipping and strand tracks.")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    def common(p):
+        p.add_argument("out_prefix", help="Output prefix for the WIG files")
+        p.add_argument("name", help="Track name (e.g. platform)")
+        p.add_argument("--full", action="store_true",
+                       help="Also write read length, MQ, identity and strand tracks, and per-strand tracks")
+        p.add_argument("--span", type=int, default=1024, help="Window size")
+        p.add_argument("--median-bins", type=int, default=64,
+                       help=f"Histogram bins per window for the medians (MQ medians are exact from {MQ_MAX + 1})")
+        p.add_argument("--min-clipped", type=int, default=100, help="Minimum clipped bases to count a clipped end")
+        p.add_argument("--bigwig", action="store_true",
+                       help="Write BigWig files (.bw, contig sizes from the alignments) instead of WIG")
+        p.add_argument("--threads", type=int, default=1,
+                       help="Parallel workers: per-contig BAM scanning (needs a BAM index) and track writing")
+
+    p_paf = sub.add_parser("paf", help="Tracks from a PAF file ('-' for stdin)")
+    p_paf.add_argument("paf")
+    common(p_paf)
+    p_bam = sub.add_parser("bam", help="Tracks directly from a (filtered) BAM, skipping unmapped and secondary")
+    p_bam.add_argument("bam")
+    common(p_bam)
+    p_bams = sub.add_parser("bams", help="Summed tracks of several BAMs (e.g. bams/*.sort.bam of winnowmap_array.sh), "
+                                         "skipping unmapped and secondary, without merging them")
+    p_bams.add_argument("bams", nargs="+")
+    common(p_bams)
+    p_bams.add_argument("--partials", help="Directory for per-BAM partial tracks, reused while the BAM is unchanged")
+    args = parser.parse_args()
+
+    tracks = WindowTracks(args.span, args.median_bins, args.min_clipped, stats=args.full)
+    if args.mode == "paf":
+        n = read_paf(tracks, args.paf)
+    elif args.mode == "bam":
+        n = collect_bam(tracks, args.bam, args.threads)
+    else:
+        n = collect_bams(tracks, args.bams, args.partials, args.threads)
+    sys.stderr.write(f"Collected {n} alignments on {len(tracks.contigs)} sequences\n")
+    tracks.write_summary(args.out_prefix, args.name, args.full, args.bigwig, args.threads)
+
+
+if __name__ == "__main__":
+    main()
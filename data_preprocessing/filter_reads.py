@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Concatenate, length/quality filter and summarize ONT FASTQs in one pass.
+
+Replaces zcat | gzip, NanoFilt and NanoPlot --huge, which each decompress the whole
+data set again. Input files are decompressed and filtered in parallel workers, each
+compressing its filtered reads as independent gzip members; the parts are concatenated
+in input order, so the output is a valid .fastq.gz identical in content to
+zcat | NanoFilt. Read length and mean quality histograms of all and of the kept reads
+are accumulated on the way and written as a summary report.
+
+Usage:
+  python filter_reads.py ${dir}/fastq_pass ${prefix}.40kbp.raw.fastq.gz -l 40000 -t 32 --summary ${prefix}.40kbp
+"""
+import argparse
+import glob
+import gzip
+import os
+import shutil
+import sys
+import zlib
+from multiprocessing import Pool
+
+import numpy as np
+
+CHUNK_READS = 20000
+QUAL_RES = 10   # mean quality histogram bins per Phred unit
+QUAL_MAX = 60
+# error probability of every Phred+33 quality character
+ERROR_PROB = 10 ** (-np.maximum(np.arange(256) - 33, 0) / 10)
+
+
+def fastq_files(inputs):
+    """Input files in order; a directory stands for its *.fastq.gz (or fastq_pass/*.fastq.gz)."""
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            found = sorted(glob.glob(os.path.join(path, "*.fastq.gz")) or
+                           glob.glob(os.path.join(path, "fastq_pass", "*.fastq.gz")))
+            if not found:
+                sys.stderr.write(f"[WARN] No .fastq.gz files in {path}\n")
+            files.extend(found)
+        else:
+            files.append(path)
+    return files
+
+
+def open_fastq(path):
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_chunks(path, chunk_reads=CHUNK_READS):
+    """Lists of 4-line records (without newlines), chunk_reads at a time."""
+    with open_fastq(path) as f:
+        lines = []
+        for line in f:
+            lines.append(line.rstrip(b"\r\n"))
+            if len(lines) == 4 * chunk_reads:
+                yield lines
+                lines = []
+        if lines:
+            if len(lines) % 4:
+                raise ValueError(f"{path}: truncated FASTQ record at the end of the file")
+            yield lines
+
+
+def mean_qualities(quals):
+    """Mean read quality as NanoFilt/NanoPlot: Phred of the average error probability."""
+    lengths = np.fromiter(map(len, quals), dtype=np.int64, count=len(quals))
+    codes = np.frombuffer(b"".join(quals), dtype=np.uint8)
+    offsets = np.cumsum(lengths) - lengths
+    sums = np.ones(len(quals))
+    nonempty = lengths > 0
+    if nonempty.any():
+        sums[nonempty] = np.add.reduceat(ERROR_PROB[codes], offsets[nonempty])
+    return -10 * np.log10(sums / np.maximum(lengths, 1))
+
+
+class ReadStats:
+    """Exact read length counts and binned mean quality counts, for all and for kept reads."""
+
+    def __init__(self):
+        self.lengths = {"all": np.zeros(1, dtype=np.int64), "kept": np.zeros(1, dtype=np.int64)}
+        self.quals = {s: np.zeros(QUAL_MAX * QUAL_RES + 1, dtype=np.int64) for s in ("all", "kept")}
+
+    def add(self, subset, lengths, quals):
+        self.add_counts(subset, np.bincount(lengths))
+        bins = np.clip(np.round(quals * QUAL_RES), 0, QUAL_MAX * QUAL_RES).astype(np.int64)
+        self.quals[subset] += np.bincount(bins, minlength=len(self.quals[subset]))
+
+    def merge(self, other):
+        for subset in ("all", "kept"):
+            self.add_counts(subset, other.lengths[subset])
+            self.quals[subset] += other.quals[subset]
+
+    def add_counts(self, subset, counts):
+        acc = self.lengths[subset]
+        if len(counts) > len(acc):
+            acc = np.concatenate([acc, np.zeros(len(counts) - len(acc), dtype=np.int64)])
+        acc[:len(counts)] += counts
+        self.lengths[subset] = acc
+
+    def summary(self, subset):
+        counts = self.lengths[subset]
+        lengths = np.arange(len(counts))
+        n = int(counts.sum())
+        bases = int((counts * lengths).sum())
+        if n == 0:
+            return {"reads": 0, "bases": 0, "mean_length": 0, "median_length": 0, "N50": 0,
+                    "max_length": 0, "mean_quality": 0, "median_quality": 0}
+        # N50: the length at which the longest reads reach half the bases
+        cum_bases = np.cumsum((counts * lengths)[::-1])
+        n50 = len(counts) - 1 - int(np.searchsorted(cum_bases, bases / 2))
+        median = int(np.searchsorted(np.cumsum(counts), (n + 1) / 2))
+        quals = self.quals[subset]
+        q_values = np.arange(len(quals)) / QUAL_RES
+        q_median = q_values[np.searchsorted(np.cumsum(quals), (n + 1) / 2)]
+        return {
+            "reads": n, "bases": bases, "mean_length": round(bases / n, 1), "median_length": median,
+            "N50": n50, "max_length": int(np.nonzero(counts)[0][-1]),
+            "mean_quality": round(float((quals * q_values).sum() / n), 2), "median_quality": q_median,
+        }
+
+
+def filter_file(path, part, min_length, max_length, min_quality, level):
+    """Filter one FASTQ into part (gzip members, one per chunk); returns the read stats."""
+    stats = ReadStats()
+    compressor_args = (level, zlib.DEFLATED, 31)   # 31: gzip container
+    with open(part, "wb") as out:
+        for lines in read_chunks(path):
+            seqs, quals = lines[1::4], lines[3::4]
+            lengths = np.fromiter(map(len, seqs), dtype=np.int64, count=len(seqs))
+            qual = mean_qualities(quals)
+            keep = lengths >= min_length
+            if max_length:
+                keep &= lengths <= max_length
+            if min_quality:
+                keep &= qual >= min_quality
+            stats.add("all", lengths, qual)
+            stats.add("kept", lengths[keep], qual[keep])
+            idx = np.nonzero(keep)[0]
+            if len(idx) == 0:
+                continue
+            records = b"\n".join(b"\n".join(lines[4 * i:4 * i + 4]) for i in idx) + b"\n"
+            z = zlib.compressobj(*compressor_args)
+            out.write(z.compress(records) + z.flush())
+    return stats
+
+
+def filter_reads(files, output, min_length=0, max_length=None, min_quality=None, threads=1, level=6):
+    part_dir = output + ".parts"
+    os.makedirs(part_dir, exist_ok=True)
+    parts = [os.path.join(part_dir, f"{i}.gz") for i in range(len(files))]
+    jobs = [(f, p, min_length, max_length, min_quality, level) for f, p in zip(files, parts)]
+
+    stats = ReadStats()
+    with Pool(threads) as pool, open(output, "wb") as out:
+        # imap keeps the input order; parts are appended as soon as they are ready in that order
+        for part, file_stats in zip(parts, pool.imap(_filter_job, jobs)):
+            stats.merge(file_stats)
+            with open(part, "rb") as f:
+                shutil.copyfileobj(f, out, 1 << 22)
+            os.remove(part)
+    os.rmdir(part_dir)
+    return stats
+
+
+def _filter_job(job):
+    return filter_file(*job)
+
+
+def write_summary(stats, prefix):
+    """<prefix>.summary.tsv (all vs kept) and <prefix>.hist.tsv (length and quality histograms)."""
+    rows = {subset: stats.summary(subset) for subset in ("all", "kept")}
+    keys = list(rows["all"])
+    with open(prefix + ".summary.tsv", "w") as out:
+        out.write("metric\tall\tkept\n")
+        for key in keys:
+            out.write(f"{key}\t{rows['all'][key]}\t{rows['kept'][key]}\n")
+
+    with open(prefix + ".hist.tsv", "w") as out:
+        out.write("subset\ttype\tbin_start\treads\tbases\n")
+        for subset in ("all", "kept"):
+            # read lengths in 1 kbp bins
+            counts = stats.lengths[subset]
+            lengths = np.arange(len(counts))
+            bins = lengths // 1000
+            reads = np.bincount(bins, weights=counts).astype(np.int64)
+            bases = np.bincount(bins, weights=counts * lengths).astype(np.int64)
+            for b in np.nonzero(reads)[0]:
+                out.write(f"{subset}\tlength\t{b * 1000}\t{reads[b]}\t{bases[b]}\n")
+            quals = stats.quals[subset]
+            for b in np.nonzero(quals)[0]:
+                out.write(f"{subset}\tquality\t{b / QUAL_RES:.1f}\t{quals[b]}\t\n")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Concatenate and filter ONT FASTQs by read length (and quality), with a read summary, in one pass.")
+    parser.add_argument("inputs", nargs="+", help="FASTQ files (plain or gz), or run directories with fastq_pass/")
+    parser.add_argument("output", help="Filtered .fastq.gz")
+    parser.add_argument("-l", "--length", type=int, default=0, help="Minimum read length (as NanoFilt -l)")
+    parser.add_argument("--maxlength", type=int, help="Maximum read length")
+    parser.add_argument("-q", "--quality", type=float, help="Minimum mean read quality (as NanoFilt -q)")
+    parser.add_argument("-t", "--threads", type=int, default=1, help="Files decompressed, filtered and compressed in parallel")
+    parser.add_argument("--level", type=int, default=6, help="gzip compression level")
+    parser.add_argument("--summary", help="Prefix for the .summary.tsv and .hist.tsv read reports")
+    args = parser.parse_args()
+
+    files = fastq_files(args.inputs)
+    if not files:
+        parser.error("no input FASTQ files")
+    stats = filter_reads(files, args.output, args.length, args.maxlength, args.quality, args.threads, args.level)
+    kept, total = stats.summary("kept"), stats.summary("all")
+    print(f"[INFO] Kept {kept['reads']} of {total['reads']} reads ({kept['bases']} of {total['bases']} bp), "
+          f"N50 {kept['N50']}")
+    if args.summary:
+        write_summary(stats, args.summary)
+        print(f"[INFO] Saved {args.summary}.summary.tsv and {args.summary}.hist.tsv")
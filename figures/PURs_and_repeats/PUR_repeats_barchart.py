@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 
 import argparse
+import gzip
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import pysam
 from collections import defaultdict
+from multiprocessing import Pool
 
 
 def parse_gtf_attributes(attr_str):
@@ -40,6 +43,13 @@ def classify_repeat(feature_type):
     return "Other"
 
 
+# Order of the classify_repeat cascade; bases covered by several classes go to the first
+CLASS_PRIORITY = ["Transposon", "Retrotransposon", "Satellite", "Simple", "LTR", "LINE", "SINE", "Repeat", "Other"]
+
+COUNT_CLASSES = CLASS_PRIORITY + ["Unannotated"]
+HAPLOTYPES = ["mat", "pat", "unphased"]
+
+
 def simplify_chrom(chrom):
     chrom = chrom.replace("chr", "")
     if chrom.endswith("_mat"):
@@ -87,6 +97,138 @@ def calculate_overlap_tabix(pur_bed, gtf_file):
     return data
 
 
+def open_text(path):
+    """Open plain, gzip or bgzip compressed text."""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt")
+    return open(path)
+
+
+def read_pur_intervals(pur_bed):
+    pur_df = pd.read_csv(pur_bed, sep="\t", header=None, names=["chrom", "start", "end"], usecols=[0, 1, 2])
+    return {chrom: (group["start"].to_numpy(dtype=np.int64), group["end"].to_numpy(dtype=np.int64))
+            for chrom, group in pur_df.groupby("chrom", sort=False)}
+
+
+def read_repeat_intervals(gtf_file, chroms):
+    """One sequential pass over the GTF; repeats on the requested chromosomes grouped by class."""
+    class_memo = {}
+    repeats = defaultdict(lambda: defaultdict(lambda: ([], [])))  # chrom -> class -> (starts, ends)
+    with open_text(gtf_file) as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            fields = line.split("\t", 5)
+            if len(fields) < 5 or fields[0] not in chroms:
+                continue
+            feature_type = fields[2]
+            cls = class_memo.get(feature_type)
+            if cls is None:
+                cls = class_memo[feature_type] = classify_repeat(feature_type)
+            starts, ends = repeats[fields[0]][cls]
+            starts.append(int(fields[3]) - 1)  # GTF is 1-based, closed
+            ends.append(int(fields[4]))
+    return repeats
+
+
+def covered_bp_by_class(pur_starts, pur_ends, class_intervals):
+    """Sweep over the elementary segments of one chromosome.
+
+    Returns non-redundant PUR bp per repeat class, each base counted once for the
+    highest-priority class covering it, plus the PUR bp without any repeat.
+    """
+    boundaries = [pur_starts, pur_ends]
+    for starts, ends in class_intervals.values():
+        boundaries.extend([np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)])
+    boundaries = np.unique(np.concatenate(boundaries))
+    seg_len = np.diff(boundaries)
+
+    def active(starts, ends):
+        delta = np.zeros(len(boundaries), dtype=np.int64)
+        np.add.at(delta, np.searchsorted(boundaries, starts), 1)
+        np.add.at(delta, np.searchsorted(boundaries, ends), -1)
+        return np.cumsum(delta)[:-1] > 0
+
+    remaining = active(pur_starts, pur_ends)
+    bp = {}
+    for cls in CLASS_PRIORITY:
+        if cls not in class_intervals:
+            continue
+        starts, ends = class_intervals[cls]
+        hit = remaining & active(np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64))
+        if hit.any():
+            bp[cls] = int(seg_len[hit].sum())
+            remaining &= ~hit
+    if remaining.any():
+        bp["Unannotated"] = int(seg_len[remaining].sum())
+    return bp
+
+
+def calculate_overlap_sweep(pur_bed, gtf_file):
+    data = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))  # chrom -> hap -> class -> bp
+
+    purs = read_pur_intervals(pur_bed)
+    repeats = read_repeat_intervals(gtf_file, set(purs))
+
+    for chrom, (pur_starts, pur_ends) in purs.items():
+        base, hap = simplify_chrom(chrom)
+        for cls, bp in covered_bp_by_class(pur_starts, pur_ends, repeats.get(chrom, {})).items():
+            data[base][hap][cls] += bp
+
+    return data
+
+
+_worker_tbx = None
+
+
+def _open_worker_tabix(gtf_file):
+    global _worker_tbx
+    _worker_tbx = pysam.TabixFile(gtf_file)
+
+
+def _scan_chromosome(chrom, pur_starts, pur_ends):
+    """Worker: tabix queries for the PURs of one chromosome, returns a class x haplotype array."""
+    class_memo = {}
+    class_intervals = defaultdict(lambda: ([], []))
+    if chrom in _worker_tbx.contigs:
+        for start, end in zip(pur_starts, pur_ends):
+            for rec in _worker_tbx.fetch(chrom, int(start), int(end)):
+                fields = rec.split("\t", 5)
+                if len(fields) < 5:
+                    continue
+                cls = class_memo.get(fields[2])
+                if cls is None:
+                    cls = class_memo[fields[2]] = classify_repeat(fields[2])
+                starts, ends = class_intervals[cls]
+                starts.append(int(fields[3]) - 1)
+                ends.append(int(fields[4]))
+
+    base, hap = simplify_chrom(chrom)
+    counts = np.zeros((len(COUNT_CLASSES), len(HAPLOTYPES)), dtype=np.int64)
+    for cls, bp in covered_bp_by_class(pur_starts, pur_ends, class_intervals).items():
+        counts[COUNT_CLASSES.index(cls), HAPLOTYPES.index(hap)] += bp
+    return base, counts
+
+
+def calculate_overlap_tabix_parallel(pur_bed, gtf_file, threads):
+    """Per-chromosome tabix scans in a process pool, each worker with its own handle."""
+    purs = read_pur_intervals(pur_bed)
+    jobs = [(chrom, starts, ends) for chrom, (starts, ends) in purs.items()]
+
+    totals = {}
+    with Pool(threads, initializer=_open_worker_tabix, initargs=(gtf_file,)) as pool:
+        for base, counts in pool.starmap(_scan_chromosome, jobs):
+            totals[base] = totals[base] + counts if base in totals else counts
+
+    data = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))  # chrom -> hap -> class -> bp
+    for base, counts in totals.items():
+        for i, j in zip(*np.nonzero(counts)):
+            data[base][HAPLOTYPES[j]][COUNT_CLASSES[i]] = int(counts[i, j])
+    return data
+
+
 def plot_stacked_two_bars_per_chromosome(data, out_file):
     records = []
     all_classes = set()
@@ -176,11 +318,23 @@ def plot_stacked_two_bars_per_chromosome(data, out_file):
 def main():
     parser = argparse.ArgumentParser(description="Stacked bar chart of PUR repeat content by haplotype.")
     parser.add_argument("--pur-bed", required=True, help="BED file with PUR coordinates")
-    parser.add_argument("--repeat-gtf", required=True, help="bgzipped + tabix-indexed GTF with repeat annotations")
+    parser.add_argument("--repeat-gtf", required=True,
+                        help="GTF with repeat annotations (plain or compressed; bgzipped + tabix-indexed for the tabix engines)")
+    parser.add_argument("--engine", choices=["sweep", "tabix", "tabix-parallel"], default="sweep",
+                        help="sweep (default): single pass over the GTF, counting each PUR base once for the "
+                             "highest-priority repeat class; tabix-parallel: same counting, with per-chromosome "
+                             "tabix queries in a process pool; tabix: legacy per-PUR queries, which count bases "
+                             "covered by overlapping annotations more than once")
+    parser.add_argument("--threads", type=int, default=1, help="Worker processes for --engine tabix-parallel")
     parser.add_argument("--out", default="pur_repeat_stacked.png", help="Output PNG file")
     args = parser.parse_args()
 
-    data = calculate_overlap_tabix(args.pur_bed, args.repeat_gtf)
+    if args.engine == "sweep":
+        data = calculate_overlap_sweep(args.pur_bed, args.repeat_gtf)
+    elif args.engine == "tabix-parallel":
+        data = calculate_overlap_tabix_parallel(args.pur_bed, args.repeat_gtf, args.threads)
+    else:
+        data = calculate_overlap_tabix(args.pur_bed, args.repeat_gtf)
     plot_stacked_two_bars_per_chromosome(data, args.out)
 
 
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 
 import argparse
+import gzip
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
-import pybedtools
 from adjustText import adjust_text
 
 plt.rcParams.update({
@@ -31,31 +32,29 @@ def merge_primers(df, max_dist=1000, verbose=False):
     df["pair_id"] = df["name"].str.extract(r"^(.+?)[_-][FR]$", expand=False)
     df["pair_id"] = df["pair_id"].fillna(df["name"])
 
-    merged_rows = []
-    grouped = df.groupby(["chrom", "pair_id"])
-
-    for (chrom, pid), group in grouped:
-        if len(group) == 2:
-            s1, e1 = group["start"].values[0], group["end"].values[0]
-            s2, e2 = group["start"].values[1], group["end"].values[1]
-
-            # Check if the primers are too far apart or if they overlap
-            if abs(s1 - s2) <= max_dist or (s1 <= e2 and s2 <= e1):  # Overlap condition
-                # Merge the primers
-                merged = group.iloc[0].copy()
-                merged["start"] = min(s1, s2)  # Merge by taking the min start position
-                merged["end"] = max(e1, e2)    # Merge by taking the max end position
-                merged["name"] = pid
-                merged_rows.append(merged.to_dict())  # Convert Series to dict
-            else:
-                # Keep both primers if they can't be merged
-                merged_rows.extend(group.to_dict("records"))
-        else:
-            # If there's only one primer, just add it as is
-            merged_rows.extend(group.to_dict("records"))
-
-    # Ensure that merged_rows is a list of dictionaries
-    merged_df = pd.DataFrame(merged_rows)
+    # Order rows by pair (stable, so mates keep their input order) and lay the mates of
+    # two-primer pairs side by side
+    df = df.sort_values(["chrom", "pair_id"], kind="mergesort").reset_index(drop=True)
+    size = df.groupby(["chrom", "pair_id"], sort=False)["pair_id"].transform("size").to_numpy()
+    first_idx = np.flatnonzero((size == 2) & (df.groupby(["chrom", "pair_id"], sort=False).cumcount().to_numpy() == 0))
+    s1, e1 = df["start"].to_numpy()[first_idx], df["end"].to_numpy()[first_idx]
+    s2, e2 = df["start"].to_numpy()[first_idx + 1], df["end"].to_numpy()[first_idx + 1]
+
+    # Merge pairs that are close enough or overlap
+    mergeable = (np.abs(s1 - s2) <= max_dist) | ((s1 <= e2) & (s2 <= e1))
+    merge_idx = first_idx[mergeable]
+
+    merged = df.iloc[merge_idx].copy()
+    merged["start"] = np.minimum(s1, s2)[mergeable]
+    merged["end"] = np.maximum(e1, e2)[mergeable]
+    merged["name"] = merged["pair_id"]
+
+    # Keep every other row as is (single primers, unmerged pairs, larger groups)
+    keep = np.ones(len(df), dtype=bool)
+    keep[merge_idx] = False
+    keep[merge_idx + 1] = False
+
+    merged_df = pd.concat([df[keep], merged]).sort_index(kind="mergesort").reset_index(drop=True)
 
     if verbose:
         print(f"Merged primers: {len(df)} → {len(merged_df)} after collapsing close pairs")
@@ -67,14 +66,31 @@ def load_primers(bed_file):
     df["type"] = df["name"].str.extract(r"^(Centromere|Distal)", expand=False).str.lower()
     return df
 
-def load_repeats(gff_file, repeat_name, shared_chroms=None, min_length=0, largest_only=False, verbose=False):
-    gff = pybedtools.BedTool(gff_file)
-    filtered = gff.filter(lambda f: f[2] == "dispersed_repeat" and repeat_name in f[8])
-
-    # Convert to BED-like format with length info
-    bed_like = filtered.each(lambda f: pybedtools.create_interval_from_list([f[0], str(int(f[3]) - 1), f[4], repeat_name])).saveas()
-
-    bed_like_df = bed_like.to_dataframe(names=["chrom", "start", "end", "name"])
+def open_gff(path):
+    """Plain, gzip or bgzip compressed GFF."""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt")
+    return open(path)
+
+def parse_repeat_gff(gff_file, repeat_names):
+    """Single pass over the GFF (plain or gz) collecting dispersed_repeat records of all requested repeats."""
+    rows = []
+    with open_gff(gff_file) as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 9 or fields[2] != "dispersed_repeat":
+                continue
+            for repeat_name in repeat_names:
+                if repeat_name in fields[8]:
+                    rows.append((fields[0], int(fields[3]) - 1, int(fields[4]), repeat_name))
+    return pd.DataFrame(rows, columns=["chrom", "start", "end", "name"])
+
+def load_repeats(repeats_df, repeat_name, shared_chroms=None, min_length=0, largest_only=False, verbose=False):
+    bed_like_df = repeats_df[repeats_df["name"] == repeat_name].copy()
     bed_like_df["length"] = bed_like_df["end"] - bed_like_df["start"]
     bed_like_df = bed_like_df[bed_like_df["length"] >= min_length]
 
@@ -94,11 +110,31 @@ def load_repeats(gff_file, repeat_name, shared_chroms=None, min_length=0, larges
         if verbose:
             print(f"Repeat '{repeat_name}': {len(bed_like_df)} entries total")
 
-    return pybedtools.BedTool.from_dataframe(bed_like_df[["chrom", "start", "end", "name"]]).saveas()
+    return bed_like_df[["chrom", "start", "end", "name"]]
+
+def closest_distances(q_start, q_end, r_start, r_end):
+    """Distance to the closest non-overlapping repeat, as reported by bedtools closest -d -io.
+
+    Book-ended intervals are 1 bp apart; -1 when no non-overlapping repeat exists.
+    """
+    starts = np.sort(r_start)
+    ends = np.sort(r_end)
+
+    # closest repeat starting at or after the query end
+    right = np.searchsorted(starts, q_end, side="left")
+    has_right = right < len(starts)
+    d_right = np.where(has_right, starts[np.minimum(right, len(starts) - 1)] - q_end + 1, np.iinfo(np.int64).max)
+
+    # closest repeat ending at or before the query start
+    left = np.searchsorted(ends, q_start, side="right") - 1
+    has_left = left >= 0
+    d_left = np.where(has_left, q_start - ends[np.maximum(left, 0)] + 1, np.iinfo(np.int64).max)
+
+    return np.where(has_left | has_right, np.minimum(d_left, d_right), -1)
 
-def compute_distance_dict(primers_df, repeat_bed, verbose=False):
+def compute_distance_dict(primers_df, repeat_df, verbose=False):
     primer_chroms = set(primers_df["chrom"].unique())
-    repeat_chroms = set([f.chrom for f in repeat_bed])
+    repeat_chroms = set(repeat_df["chrom"].unique())
     shared_chroms = primer_chroms & repeat_chroms
 
     if verbose:
@@ -109,16 +145,19 @@ def compute_distance_dict(primers_df, repeat_bed, verbose=False):
     if not shared_chroms:
         return {}
 
-    filtered_primers = primers_df[primers_df["chrom"].isin(shared_chroms)].copy()
-    filtered_primers = filtered_primers.sort_values(["chrom", "start", "end"])
-    primers_bt = pybedtools.BedTool.from_dataframe(filtered_primers).saveas()
-    repeat_bed = repeat_bed.filter(lambda f: f[0].strip() in shared_chroms).sort().saveas()
+    filtered_primers = primers_df[primers_df["chrom"].isin(shared_chroms)]
+    repeats_by_chrom = {chrom: group for chrom, group in repeat_df.groupby("chrom")}
 
-    closest = primers_bt.closest(repeat_bed, d=True, io=True)
     distances = {}
-    for f in closest:
-        key = (f[0], int(f[1]), int(f[2]), f[3])
-        distances[key] = int(f[-1])
+    for chrom, group in filtered_primers.groupby("chrom"):
+        repeats = repeats_by_chrom[chrom]
+        starts = group["start"].to_numpy(dtype=np.int64)
+        ends = group["end"].to_numpy(dtype=np.int64)
+        dist = closest_distances(starts, ends,
+                                 repeats["start"].to_numpy(dtype=np.int64),
+                                 repeats["end"].to_numpy(dtype=np.int64))
+        for s, e, name, d in zip(starts, ends, group["name"], dist):
+            distances[(chrom, int(s), int(e), name)] = int(d)
 
     if verbose:
         print(f"Returning {len(distances)} distances")
@@ -181,8 +220,9 @@ def main(primers_file, gff_file, out_plot, verbose=False, min_repeat_len=0,
     ))
 
     shared_chroms = set(primers["chrom"].unique())
-    repeats_716A = load_repeats(gff_file, "Tgut716A", shared_chroms, min_length=min_repeat_len, largest_only=largest_repeat_only, verbose=verbose)
-    repeats_191A = load_repeats(gff_file, "Tgut191A", shared_chroms, min_length=min_repeat_len, largest_only=largest_repeat_only, verbose=verbose)
+    repeats = parse_repeat_gff(gff_file, ["Tgut716A", "Tgut191A"])
+    repeats_716A = load_repeats(repeats, "Tgut716A", shared_chroms, min_length=min_repeat_len, largest_only=largest_repeat_only, verbose=verbose)
+    repeats_191A = load_repeats(repeats, "Tgut191A", shared_chroms, min_length=min_repeat_len, largest_only=largest_repeat_only, verbose=verbose)
 
     dist_716A = compute_distance_dict(primers, repeats_716A, verbose)
     dist_191A = compute_distance_dict(primers, repeats_191A, verbose)
@@ -220,7 +260,7 @@ def main(primers_file, gff_file, out_plot, verbose=False, min_repeat_len=0,
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Plot distances of primers to centromeric repeats.")
     parser.add_argument("--primers", required=True, help="Tab-delimited BED file with primer coordinates and names.")
-    parser.add_argument("--gff", required=True, help="GFF file with centromeric repeat annotations.")
+    parser.add_argument("--gff", required=True, help="GFF file with centromeric repeat annotations (plain or gz).")
     parser.add_argument("--out", default="primer_distances.png", help="Output base name for plots.")
     parser.add_argument("--min-repeat-len", type=int, default=0, help="Minimum repeat length (in bp) to include.")
     parser.add_argument("--macrochrs", help="File listing macrochromosome names (one per line)")
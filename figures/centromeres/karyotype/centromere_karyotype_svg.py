@@ -16,32 +16,36 @@ Inputs:
 Example:
   python centromere_karyotype_svg.py --gff centromeres.gff3 --fai genome.fa.fai --out karyotype.svg \
     --columns 8 --chrom-height 360 --image-slot-width 120 --show-image-slots
+
+Batch mode renders several karyotypes (haplotypes, assembly versions) in one run from a
+tab-separated manifest with one "fai<TAB>gff<TAB>out" job per line; inputs shared between
+jobs are parsed once and jobs are rendered in parallel:
+  python centromere_karyotype_svg.py --manifest jobs.tsv --threads 4 --columns 8
 """
 import argparse
 import math
+import os
 import re
 import sys
+from multiprocessing import Pool
 from typing import Dict, Tuple, List
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+import genome_tracks
+
 def read_fai(path):
-    lens = {}
-    with open(path) as f:
-        for line in f:
-            if not line.strip(): continue
-            p = line.rstrip("\n").split("\t")
-            if len(p) < 2: continue
-            try:
-                lens[p[0]] = int(p[1])
-            except ValueError:
-                pass
-    return lens
+    sizes = genome_tracks.chrom_sizes(path)
+    return dict(zip(sizes["seqid"], sizes["length"].tolist()))
 
-def read_centromeres(path):
+def read_centromeres(path, feature_type=None):
     best = {}
+    # cheap substring test so other features never reach the integer parsing
+    tag = f"\t{feature_type}\t" if feature_type else ""
     with open(path) as f:
         for line in f:
-            if not line.strip() or line.startswith("#"): continue
+            if tag not in line or line.startswith("#"): continue
             p = line.rstrip("\n").split("\t")
+            if feature_type and p[2] != feature_type: continue
             if len(p) < 5: continue
             name = p[0]
             try:
@@ -66,34 +70,11 @@ def sort_chromosomes(names):
         return (9_999_999, 0, 0, n)
     return sorted(names, key=key)
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--gff", required=True)
-    ap.add_argument("--fai", required=True)
-    ap.add_argument("--out", required=True)
-    ap.add_argument("--columns", type=int, default=8)
-    ap.add_argument("--chrom-height", type=float, default=360.0, help="Reference height for the longest chromosome")
-    ap.add_argument("--bar-width", type=float, default=14.0)
-    ap.add_argument("--tick-width", type=float, default=18.0)
-    ap.add_argument("--image-slot-width", type=float, default=140.0)
-    ap.add_argument("--col-gap", type=float, default=70.0)
-    ap.add_argument("--row-gap", type=float, default=160.0)
-    ap.add_argument("--margin-left", type=float, default=60.0)
-    ap.add_argument("--margin-right", type=float, default=60.0)
-    ap.add_argument("--margin-top", type=float, default=40.0)
-    ap.add_argument("--margin-bottom", type=float, default=60.0)
-    ap.add_argument("--font-size", type=float, default=14.0)
-    ap.add_argument("--label-dy", type=float, default=20.0)
-    ap.add_argument("--show-image-slots", action="store_true")
-    ap.add_argument("--show-centromere-band", action="store_true", help="Draw gray centromere span (off by default)")
-    args = ap.parse_args()
-
-    lengths = read_fai(args.fai)
-    centrs = read_centromeres(args.gff)
+def render_karyotype(lengths, centrs, out_path, args):
+    """Write one karyotype SVG, streaming elements to out_path. Returns False if nothing to draw."""
     names = [n for n in sort_chromosomes(list(centrs.keys())) if n in lengths]
     if not names:
-        sys.stderr.write("No overlapping chromosomes between GFF and FAI.\n")
-        sys.exit(1)
+        return False
 
     n = len(names); cols = max(1, args.columns); rows = math.ceil(n/cols)
     L_max = max(lengths[nm] for nm in names)
@@ -115,70 +96,140 @@ def main():
         row_tops.append(acc)
         acc += row_max_heights[r] + args.label_dy + (args.row_gap if r < rows-1 else 0.0)
 
-    out = []
-    def add(s): out.append(s)
-    add(f'<svg xmlns="http://www.w3.org/2000/svg" width="{int(total_w)}" height="{int(total_h)}" viewBox="0 0 {int(total_w)} {int(total_h)}">')
-    add('<style> text { font-family: Arial, Helvetica, sans-serif; } </style>')
-    add(f'<rect x="0" y="0" width="{int(total_w)}" height="{int(total_h)}" fill="white"/>')
-
-    for idx, name in enumerate(names):
-        L = lengths[name]
-        cstart, cend = centrs[name]
-        h_i = heights[name]
-
-        row = idx // cols; col = idx % cols
-        top_y = row_tops[row]
-        x0 = args.margin_left + col * (cell_w + args.col_gap) + args.bar_width / 2.0
-
-        # ClipPath with rounded rect
-        add(f'<clipPath id="clip_{idx}">')
-        add(f'<rect x="{x0 - args.bar_width/2:.2f}" y="{top_y:.2f}" width="{args.bar_width:.2f}" height="{h_i:.2f}" '
-            f'rx="{args.bar_width/2:.2f}" />')
-        add(f'</clipPath>')
-
-        # Base bar and outline
-        add(f'<rect x="{x0 - args.bar_width/2:.2f}" y="{top_y:.2f}" width="{args.bar_width:.2f}" height="{h_i:.2f}" '
-            f'rx="{args.bar_width/2:.2f}" fill="#ffffff" stroke="#222" stroke-width="1"/>')
-
-        # Optional centromere band (clipped) with strict mirroring to upper half when centroid > 0.5
-        s_raw, e_raw = (cstart, cend) if cstart <= cend else (cend, cstart)
-        mid_frac = ((s_raw + e_raw) / 2.0) / L
-        s_frac = s_raw / L
-        e_frac = e_raw / L
-        if mid_frac > 0.5:
-            s_frac = 1.0 - s_frac
-            e_frac = 1.0 - e_frac
-        y_start = top_y + min(s_frac, e_frac) * h_i
-        y_end   = top_y + max(s_frac, e_frac) * h_i
-        cheight = max(1.0, y_end - y_start)
-        if args.show_centromere_band:
-            add(f'<rect clip-path="url(#clip_{idx})" x="{x0 - args.bar_width/2:.2f}" y="{y_start:.2f}" width="{args.bar_width:.2f}" height="{cheight:.2f}" '
-                f'fill="#b7b7b7" stroke="none"/>')
-
-        # Outline again on top
-        add(f'<rect x="{x0 - args.bar_width/2:.2f}" y="{top_y:.2f}" width="{args.bar_width:.2f}" height="{h_i:.2f}" '
-            f'rx="{args.bar_width/2:.2f}" fill="none" stroke="#222" stroke-width="1"/>')
-
-        # Pink/red tick mirrored to upper half
-        frac = ((cstart + cend) / (2.0 * L))
-        if frac > 0.5:
-            frac = 1.0 - frac
-        y_mid = top_y + frac * h_i
-        add(f'<line x1="{x0 - args.tick_width/2:.2f}" y1="{y_mid:.2f}" x2="{x0 + args.tick_width/2:.2f}" y2="{y_mid:.2f}" '
-            f'stroke="#d94c8a" stroke-width="2"/>')
-
-        if args.show_image_slots:
-            slot_x = x0 + args.bar_width/2 + 6
-            add(f'<rect x="{slot_x:.2f}" y="{top_y:.2f}" width="{args.image_slot_width - 6:.2f}" height="{h_i:.2f}" '
-                f'fill="none" stroke="#cccccc" stroke-dasharray="4,4" stroke-width="1"/>')
-
-        label_y = top_y + h_i + args.label_dy
-        add(f'<text x="{x0:.2f}" y="{label_y:.2f}" font-size="{args.font_size:.1f}" text-anchor="middle">{name}</text>')
-
-    add('</svg>')
-
-    with open(args.out, "w") as fh:
-        fh.write("\\n".join(out))
+    with open(out_path, "w") as fh:
+        def add(s): fh.write(s + "\n")
+        add(f'<svg xmlns="http://www.w3.org/2000/svg" width="{int(total_w)}" height="{int(total_h)}" viewBox="0 0 {int(total_w)} {int(total_h)}">')
+        add('<style> text { font-family: Arial, Helvetica, sans-serif; } </style>')
+        add(f'<rect x="0" y="0" width="{int(total_w)}" height="{int(total_h)}" fill="white"/>')
+
+        for idx, name in enumerate(names):
+            L = lengths[name]
+            cstart, cend = centrs[name]
+            h_i = heights[name]
+
+            row = idx // cols; col = idx % cols
+            top_y = row_tops[row]
+            x0 = args.margin_left + col * (cell_w + args.col_gap) + args.bar_width / 2.0
+
+            # ClipPath with rounded rect
+            add(f'<clipPath id="clip_{idx}">')
+            add(f'<rect x="{x0 - args.bar_width/2:.2f}" y="{top_y:.2f}" width="{args.bar_width:.2f}" height="{h_i:.2f}" '
+                f'rx="{args.bar_width/2:.2f}" />')
+            add(f'</clipPath>')
+
+            # Base bar and outline
+            add(f'<rect x="{x0 - args.bar_width/2:.2f}" y="{top_y:.2f}" width="{args.bar_width:.2f}" height="{h_i:.2f}" '
+                f'rx="{args.bar_width/2:.2f}" fill="#ffffff" stroke="#222" stroke-width="1"/>')
+
+            # Optional centromere band (clipped) with strict mirroring to upper half when centroid > 0.5
+            s_raw, e_raw = (cstart, cend) if cstart <= cend else (cend, cstart)
+            mid_frac = ((s_raw + e_raw) / 2.0) / L
+            s_frac = s_raw / L
+            e_frac = e_raw / L
+            if mid_frac > 0.5:
+                s_frac = 1.0 - s_frac
+                e_frac = 1.0 - e_frac
+            y_start = top_y + min(s_frac, e_frac) * h_i
+            y_end   = top_y + max(s_frac, e_frac) * h_i
+            cheight = max(1.0, y_end - y_start)
+            if args.show_centromere_band:
+                add(f'<rect clip-path="url(#clip_{idx})" x="{x0 - args.bar_width/2:.2f}" y="{y_start:.2f}" width="{args.bar_width:.2f}" height="{cheight:.2f}" '
+                    f'fill="#b7b7b7" stroke="none"/>')
+
+            # Outline again on top
+            add(f'<rect x="{x0 - args.bar_width/2:.2f}" y="{top_y:.2f}" width="{args.bar_width:.2f}" height="{h_i:.2f}" '
+                f'rx="{args.bar_width/2:.2f}" fill="none" stroke="#222" stroke-width="1"/>')
+
+            # Pink/red tick mirrored to upper half
+            frac = ((cstart + cend) / (2.0 * L))
+            if frac > 0.5:
+                frac = 1.0 - frac
+            y_mid = top_y + frac * h_i
+            add(f'<line x1="{x0 - args.tick_width/2:.2f}" y1="{y_mid:.2f}" x2="{x0 + args.tick_width/2:.2f}" y2="{y_mid:.2f}" '
+                f'stroke="#d94c8a" stroke-width="2"/>')
+
+            if args.show_image_slots:
+                slot_x = x0 + args.bar_width/2 + 6
+                add(f'<rect x="{slot_x:.2f}" y="{top_y:.2f}" width="{args.image_slot_width - 6:.2f}" height="{h_i:.2f}" '
+                    f'fill="none" stroke="#cccccc" stroke-dasharray="4,4" stroke-width="1"/>')
+
+            label_y = top_y + h_i + args.label_dy
+            add(f'<text x="{x0:.2f}" y="{label_y:.2f}" font-size="{args.font_size:.1f}" text-anchor="middle">{name}</text>')
+
+        add('</svg>')
+    return True
+
+def read_manifest(path):
+    """Jobs as (fai, gff, out), and the outputs of the jobs skipped for missing inputs."""
+    jobs, skipped = [], []
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip() or line.startswith("#"): continue
+            p = line.rstrip("\n").split("\t")
+            if len(p) < 3:
+                sys.stderr.write(f"Skipping manifest line with fewer than 3 columns: {line}")
+                continue
+            missing = [x for x in p[:2] if not os.path.exists(x)]
+            if missing:
+                sys.stderr.write(f"{path}:{n}: skipping the job for {p[2]}, missing {', '.join(missing)}\n")
+                skipped.append(p[2])
+                continue
+            jobs.append((p[0], p[1], p[2]))
+    return jobs, skipped
+
+def _render_job(job):
+    lengths, centrs, out_path, args = job
+    return out_path, render_karyotype(lengths, centrs, out_path, args)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--gff")
+    ap.add_argument("--fai")
+    ap.add_argument("--out")
+    ap.add_argument("--manifest", help="TSV of fai, gff, out jobs rendered in one run (replaces --gff/--fai/--out)")
+    ap.add_argument("--threads", type=int, default=1, help="Worker processes for --manifest")
+    ap.add_argument("--feature-type", help="Only use GFF features of this type (default: any type)")
+    ap.add_argument("--columns", type=int, default=8)
+    ap.add_argument("--chrom-height", type=float, default=360.0, help="Reference height for the longest chromosome")
+    ap.add_argument("--bar-width", type=float, default=14.0)
+    ap.add_argument("--tick-width", type=float, default=18.0)
+    ap.add_argument("--image-slot-width", type=float, default=140.0)
+    ap.add_argument("--col-gap", type=float, default=70.0)
+    ap.add_argument("--row-gap", type=float, default=160.0)
+    ap.add_argument("--margin-left", type=float, default=60.0)
+    ap.add_argument("--margin-right", type=float, default=60.0)
+    ap.add_argument("--margin-top", type=float, default=40.0)
+    ap.add_argument("--margin-bottom", type=float, default=60.0)
+    ap.add_argument("--font-size", type=float, default=14.0)
+    ap.add_argument("--label-dy", type=float, default=20.0)
+    ap.add_argument("--show-image-slots", action="store_true")
+    ap.add_argument("--show-centromere-band", action="store_true", help="Draw gray centromere span (off by default)")
+    args = ap.parse_args()
+
+    skipped = []
+    if args.manifest:
+        jobs, skipped = read_manifest(args.manifest)
+    elif args.gff and args.fai and args.out:
+        jobs = [(args.fai, args.gff, args.out)]
+    else:
+        ap.error("either --manifest or all of --gff, --fai and --out are required")
+
+    # parse each input file once, even when several jobs share it
+    fais = {fai: read_fai(fai) for fai in {j[0] for j in jobs}}
+    gffs = {gff: read_centromeres(gff, args.feature_type) for gff in {j[1] for j in jobs}}
+    work = [(fais[fai], gffs[gff], out, args) for fai, gff, out in jobs]
+
+    if len(work) > 1 and args.threads > 1:
+        with Pool(args.threads) as pool:
+            results = pool.map(_render_job, work)
+    else:
+        results = [_render_job(w) for w in work]
+
+    failed = [out for out, ok in results if not ok]
+    for out in failed:
+        sys.stderr.write(f"No overlapping chromosomes between GFF and FAI for {out}.\n")
+    if failed or skipped:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,15 @@
 #!/usr/bin/env python3
 
+import argparse
+import gzip
+import math
+import os
 import sys
 from collections import defaultdict
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import genome_tracks
 
 def parse_gff_compute_lengths(file_path):
     max_len = defaultdict(int)
@@ -26,9 +34,150 @@ def parse_gff_compute_lengths(file_path):
     for chrom in sorted(max_len):
         print(f"{chrom}\t{max_len[chrom]}")
 
+def cached_max_lengths(file_path, motif):
+    """Same report from the cached figure data of the full GFF, for the units whose motif contains motif (as grep)."""
+    units = genome_tracks.repeat_units(file_path, motifs=[motif], substring=True)
+    units["unit_len"] = units["end"] - units["start"] + 1
+    max_len = units.groupby("seqid", observed=True)["unit_len"].max()
+
+    for chrom in sorted(max_len.index):
+        print(f"{chrom}\t{max_len[chrom]}")
+
+# Length histogram with HIST_RES bins per doubling, enough for any unit or array length
+HIST_RES = 32
+HIST_BINS = 48 * HIST_RES
+
+def length_bin(unit_len):
+    return min(int(math.log2(unit_len) * HIST_RES), HIST_BINS - 1)
+
+def bin_start(b):
+    """Smallest integer length falling into bin b."""
+    return math.ceil(2 ** (b / HIST_RES))
+
+def new_stats():
+    # count, total bp, max, per-bin counts, per-bin bp
+    return [0, 0, 0, [0] * HIST_BINS, [0] * HIST_BINS]
+
+def add_unit(stats, unit_len):
+    stats[0] += 1
+    stats[1] += unit_len
+    if unit_len > stats[2]:
+        stats[2] = unit_len
+    b = length_bin(unit_len)
+    stats[3][b] += 1
+    stats[4][b] += unit_len
+
+def merge_stats(a, b):
+    a[0] += b[0]
+    a[1] += b[1]
+    a[2] = max(a[2], b[2])
+    a[3] = [x + y for x, y in zip(a[3], b[3])]
+    a[4] = [x + y for x, y in zip(a[4], b[4])]
+
+def n50(stats):
+    """N50 from the bp histogram, exact up to the bin resolution (and capped by the max)."""
+    half = stats[1] / 2
+    acc = 0
+    for b in range(HIST_BINS - 1, -1, -1):
+        acc += stats[4][b]
+        if acc >= half:
+            return min(bin_start(b), stats[2])
+    return 0
+
+def accumulate(lines, motifs, acc):
+    """Add every matching GFF line to acc[(chrom, motif)]."""
+    for line in lines:
+        if line.startswith("#"):
+            continue
+        if motifs and not any(m in line for m in motifs):
+            continue
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) < 5:
+            continue
+        try:
+            unit_len = int(fields[4]) - int(fields[3]) + 1
+        except ValueError:
+            continue
+        if unit_len < 1:
+            continue
+        name = genome_tracks.motif_name(fields[8]) if len(fields) > 8 else None
+        if motifs:
+            motif = name if name in motifs else next(x for x in motifs if x in line)
+        else:
+            motif = name or "."
+        key = (fields[0], motif)
+        if key not in acc:
+            acc[key] = new_stats()
+        add_unit(acc[key], unit_len)
+    return acc
+
+def open_gff(path):
+    """Plain, gzip or bgzip compressed GFF."""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt")
+    return open(path)
+
+def _scan_contig(path, contig, motifs):
+    import pysam
+    with pysam.TabixFile(path) as tbx:
+        return accumulate(tbx.fetch(contig), motifs, {})
+
+def stream_stats(path, motifs=None, threads=1):
+    """Single pass (or tabix-sharded parallel pass) over the GFF."""
+    indexed = os.path.exists(path + ".tbi") or os.path.exists(path + ".csi")
+    if threads > 1 and indexed:
+        import pysam
+        with pysam.TabixFile(path) as tbx:
+            contigs = list(tbx.contigs)
+        with Pool(threads) as pool:
+            shards = pool.starmap(_scan_contig, [(path, c, motifs) for c in contigs])
+        acc = {}
+        for shard in shards:
+            for key, stats in shard.items():
+                if key in acc:
+                    merge_stats(acc[key], stats)
+                else:
+                    acc[key] = stats
+        return acc
+
+    with open_gff(path) as f:
+        return accumulate(f, motifs, {})
+
+def write_stats(acc, out, hist_out=None):
+    out.write("chrom\tmotif\tcount\ttotal_bp\tmax\tN50\n")
+    for chrom, motif in sorted(acc):
+        stats = acc[(chrom, motif)]
+        out.write(f"{chrom}\t{motif}\t{stats[0]}\t{stats[1]}\t{stats[2]}\t{n50(stats)}\n")
+
+    if hist_out:
+        with open(hist_out, "w") as h:
+            h.write("chrom\tmotif\tbin_start\tcount\tbp\n")
+            for chrom, motif in sorted(acc):
+                stats = acc[(chrom, motif)]
+                for b in range(HIST_BINS):
+                    if stats[3][b]:
+                        h.write(f"{chrom}\t{motif}\t{bin_start(b)}\t{stats[3][b]}\t{stats[4][b]}\n")
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python max_unit_len_per_chrom.py input.gff")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Per-chromosome repeat unit lengths. Without --stats, prints the max unit length per chromosome.")
+    parser.add_argument("gff", help="GFF with repeat units (plain, gz or bgz)")
+    parser.add_argument("motif", nargs="?",
+                        help="Motif(s) to keep, comma-separated (e.g. Tgut716A); "
+                             "without --stats the max is read from the cached figure data")
+    parser.add_argument("--stats", action="store_true",
+                        help="Report count, total bp, max and N50 per chromosome and motif in one pass")
+    parser.add_argument("--hist", help="With --stats, also write the length histograms to this TSV")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="With --stats on a bgzipped, tabix-indexed GFF, scan chromosomes in parallel")
+    args = parser.parse_intermixed_args()
 
-    parse_gff_compute_lengths(sys.argv[1])
\ No newline at end of file
+    if args.stats:
+        motifs = args.motif.split(",") if args.motif else None
+        write_stats(stream_stats(args.gff, motifs, args.threads), sys.stdout, args.hist)
+    elif args.motif:
+        cached_max_lengths(args.gff, args.motif)
+    else:
+        parse_gff_compute_lengths(args.gff)
@@ -1,38 +1,105 @@
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+
+def repeat_presence(gff, motifs, metric='total', max_gap=1000):
+    """Per chromosome and motif: largest array (units at most max_gap apart) or total bp, from the cached GFF units.
+
+    Motifs are matched as the grep of the README, as substrings of the motif name of every unit.
+    """
+    import genome_tracks
+    units = genome_tracks.repeat_units(gff, motifs=motifs, substring=True)
+    units = units.assign(seqid=units['seqid'].astype(str), motif=units['motif'].astype(str))
+    units = units.sort_values(['seqid', 'motif', 'start'], kind='stable').reset_index(drop=True)
+
+    if metric == 'total':
+        # same sum as the awk one-liner of the README ($5 - $4), over the lines with a Target
+        units['bp'] = units['end'] - units['start']
+        values = units.groupby(['seqid', 'motif'], sort=False)['bp'].sum()
+    else:
+        # a new array starts at a new chromosome/motif or after a gap larger than max_gap
+        key = units['seqid'] + '\t' + units['motif']
+        prev_end = units.groupby(key, sort=False)['end'].cummax().shift()
+        new = (key != key.shift()) | (units['start'] - prev_end - 1 > max_gap)
+        array_id = np.cumsum(new.to_numpy())
+        arrays = units.groupby(array_id).agg(seqid=('seqid', 'first'), motif=('motif', 'first'),
+                                             start=('start', 'min'), end=('end', 'max'))
+        arrays['bp'] = arrays['end'] - arrays['start'] + 1
+        values = arrays.groupby(['seqid', 'motif'], sort=False)['bp'].max()
+
+    df = values.rename('Value').reset_index().rename(columns={'seqid': 'Chromosome'})
+    df['haplotype'] = genome_tracks.haplotype(df['Chromosome']).to_numpy()
+    return df
+
 
 # Set up argument parser
-parser = argparse.ArgumentParser(description='Scatter plot of "Tgut716" and "Tgut191A" repeats from two CSV files.')
-parser.add_argument('mat_csv', type=str, help='Path to the CSV file for "Tgut716" repeats')
-parser.add_argument('pat_csv', type=str, help='Path to the CSV file for "Tgut191A" repeats')
+parser = argparse.ArgumentParser(description='Scatter plot of "Tgut716" and "Tgut191A" repeats from two CSV files, '
+                                             'or computed from the repeat GFF.')
+parser.add_argument('mat_csv', type=str, nargs='?', help='Path to the CSV file for "Tgut716" repeats')
+parser.add_argument('pat_csv', type=str, nargs='?', help='Path to the CSV file for "Tgut191A" repeats')
+parser.add_argument('--gff', help='Repeat GFF (units with a Target motif); parsed once and cached as <gff>.tracks.npz')
+parser.add_argument('--motifs', nargs='+', default=['Tgut716A', 'Tgut191A'], help='Motifs to plot with --gff')
+parser.add_argument('--metric', choices=['total', 'array'], default='total',
+                    help='With --gff: total annotated bp or largest array per chromosome')
+parser.add_argument('--max-gap', type=int, default=1000, help='With --gff: largest gap (bp) within an array')
+parser.add_argument('--save-csv', help='With --gff: also save the values as <prefix>.<motif>.csv (Chromosome,Value)')
+parser.add_argument('-o', '--output', default='scatter_repeats.png', help='Output PNG')
 
 # Parse the arguments
 args = parser.parse_args()
+if not args.gff and not (args.mat_csv and args.pat_csv):
+    parser.error('give the two CSV files or --gff')
 
-# Read the "Tgut716" and "Tgut191A" CSV files
-mat_repeats = pd.read_csv(args.mat_csv, header=None, names=['Chromosome', 'Value'])
-pat_repeats = pd.read_csv(args.pat_csv, header=None, names=['Chromosome', 'Value'])
+if args.gff:
+    presence = repeat_presence(args.gff, args.motifs, args.metric, args.max_gap)
+    series = []
+    for motif in args.motifs:
+        values = presence[presence['motif'] == motif].sort_values(by='Chromosome')
+        series.append((f'{motif} repeats', values))
+        if args.save_csv:
+            values[['Chromosome', 'Value']].to_csv(f'{args.save_csv}.{motif}.csv', header=False, index=False)
+else:
+    # Read the "Tgut716" and "Tgut191A" CSV files
+    mat_repeats = pd.read_csv(args.mat_csv, header=None, names=['Chromosome', 'Value'])
+    pat_repeats = pd.read_csv(args.pat_csv, header=None, names=['Chromosome', 'Value'])
 
-# Sort both "Tgut716" and "Tgut191A" by chromosome name to match corresponding repeats
-mat_repeats = mat_repeats.sort_values(by='Chromosome')
-pat_repeats = pat_repeats.sort_values(by='Chromosome')
+    # Sort both "Tgut716" and "Tgut191A" by chromosome name to match corresponding repeats
+    mat_repeats = mat_repeats.sort_values(by='Chromosome')
+    pat_repeats = pat_repeats.sort_values(by='Chromosome')
+    series = [('Tgut716 repeats', mat_repeats), ('Tgut191A repeats', pat_repeats)]
 
-# Create the plot with a narrow figure size
-fig, ax = plt.subplots(figsize=(2, 8))  # Adjusted size (width, height)
+colors = ['blue', 'red', 'green', 'orange', 'purple']
+markers = {'mat': 'o', 'pat': '^'}
 
-# Scatter plot for 'Tgut716' repeats
-ax.scatter([1] * len(mat_repeats), mat_repeats['Value'], label='Tgut716 repeats', color='blue')
+# Create the plot with a narrow figure size: one inch of width per column of points
+column_width = 1
+fig, ax = plt.subplots(figsize=(column_width * len(series), 8))  # Adjusted size (width, height)
 
-# Scatter plot for 'Tgut191A' repeats
-ax.scatter([2] * len(pat_repeats), pat_repeats['Value'], label='Tgut191A repeats', color='red')
+# One column of points per motif, with a marker per haplotype when known
+for x, (label, values) in enumerate(series, start=1):
+    color = colors[(x - 1) % len(colors)]
+    if 'haplotype' in values and values['haplotype'].notna().any():
+        for hap, marker in markers.items():
+            sub = values[values['haplotype'] == hap]
+            ax.scatter([x] * len(sub), sub['Value'], label=f'{label} ({hap})', color=color, marker=marker)
+        sub = values[values['haplotype'].isna()]
+        if len(sub):
+            ax.scatter([x] * len(sub), sub['Value'], label=label, color=color)
+    else:
+        ax.scatter([x] * len(values), values['Value'], label=label, color=color)
 
 # Add a dashed line at 10 kbp
 ax.axhline(y=10000, color='black', linestyle='--', label='10 kbp')
 
 # Customize plot
-ax.set_xticks([1, 2])
-ax.set_xticklabels(['Tgut716 repeats', 'Tgut191A repeats'])
+ax.set_xticks(range(1, len(series) + 1))
+ax.set_xticklabels([label for label, _ in series])
 ax.set_yscale('log')
 ax.set_ylabel('Repeat Values (bp)')
 
@@ -44,7 +111,7 @@ ax.legend(loc='upper left', bbox_to_anchor=(1, 1), frameon=False)  # Position th
 plt.tight_layout()
 
 # Save the plot as a PNG file
-plt.savefig('scatter_repeats.png', dpi=300, bbox_inches='tight')
+plt.savefig(args.output, dpi=300, bbox_inches='tight')
 
 # Show the plot
 plt.show()
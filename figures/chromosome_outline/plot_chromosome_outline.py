@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 
-import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 import argparse
+import os
 import re
+import sys
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import genome_tracks
+
 plt.rcParams.update({
     'font.size': 28,
     'axes.titlesize': 32,
@@ -22,8 +27,53 @@ plt.rcParams.update({
 def natural_sort_key(s):
     return [int(t) if t.isdigit() else t for t in re.split(r'(\d+)', s)]
 
+def group_repeat_blocks(df):
+    """(seqid, repeat) -> (starts, ends) arrays, grouped once for all draws."""
+    return {
+        key: (g['start'].to_numpy(), g['end'].to_numpy())
+        for key, g in df.groupby(['seqid', 'repeat'], sort=False, observed=True)
+    }
+
+def merge_blocks(xs, widths, tol):
+    """Merge blocks closer than tol (e.g. one output pixel) into single blocks."""
+    order = np.argsort(xs, kind='stable')
+    xs, ends = xs[order], xs[order] + widths[order]
+    # a new block starts where the gap to everything drawn so far exceeds tol
+    reach = np.maximum.accumulate(ends)
+    new = np.ones(len(xs), dtype=bool)
+    new[1:] = xs[1:] > reach[:-1] + tol
+    idx = np.flatnonzero(new)
+    merged_ends = np.maximum.reduceat(ends, idx)
+    return xs[idx], merged_ends - xs[idx]
+
+def draw_repeat_blocks(ax, blocks, hap_id, x_off, y_pos, length, flipped,
+                       chr_height, colors, merge_bp=0, patches=False):
+    """Draw the repeat units of one haplotype, one collection per motif."""
+    for rt in ('Tgut191A','Tgut716A'):
+        if (hap_id, rt) not in blocks:
+            continue
+        starts, ends = blocks[(hap_id, rt)]
+        xs = length - ends if flipped else starts
+        widths = np.maximum(ends - starts, 100_000)
+        if patches:
+            for st, seg in zip(xs, widths):
+                ax.add_patch(mpatches.Rectangle(
+                    (x_off + st, y_pos - chr_height/2),
+                    seg, chr_height,
+                    facecolor=colors[rt], edgecolor='none', zorder=2
+                ))
+            continue
+        if merge_bp > 0:
+            xs, widths = merge_blocks(xs, widths, merge_bp)
+        ax.broken_barh(
+            np.column_stack([x_off + xs, widths]),
+            (y_pos - chr_height/2, chr_height),
+            facecolors=colors[rt], edgecolor='none', zorder=2
+        )
+
 def plot_chromosome_full(gff_file, fai_file, out_file,
-                         flipped_file=None, submetacentric_file=None):
+                         flipped_file=None, submetacentric_file=None,
+                         merge_subpixel=False, patches=False):
     # — read flip/submeta lists —
     flipped_chromosomes = set()
     if flipped_file:
@@ -34,33 +84,22 @@ def plot_chromosome_full(gff_file, fai_file, out_file,
         with open(submetacentric_file) as f:
             submetacentric_chroms = {l.strip() for l in f if l.strip()}
 
-    # — load GFF —
-    df = pd.read_csv(
-        gff_file, sep='\t', comment='#', header=None,
-        names=['seqid','source','type','start','end','score','strand','phase','attributes']
-    )
-    df = df[df['type']=='dispersed_repeat']
-    df['repeat'] = df['attributes'].str.extract(
-        r'Target "Motif:(Tgut(?:716A|191A))"'
-    )
-    df = df.dropna(subset=['repeat'])
+    # — load GFF (cached) —
+    df = genome_tracks.repeat_units(gff_file, motifs=['Tgut716A', 'Tgut191A'], feature_type='dispersed_repeat')
+    df['seqid'] = df['seqid'].astype(str)
+    df['repeat'] = df['motif'].astype(str)
     df['base_chrom'] = (
         df['seqid']
         .str.replace("_mat","")
         .str.replace("_pat","")
         .str.replace("^chr","",regex=True)
     )
-    df['haplotype'] = df['seqid'].str.extract(r'_(mat|pat)')
-    df[['start','end']] = df[['start','end']].astype(int)
 
-    # — load .fai —
-    chrom_sizes = pd.read_csv(
-        fai_file, sep='\t', header=None, usecols=[0,1],
-        names=['seqid','length']
-    )
+    # — load .fai (cached) —
+    chrom_sizes = genome_tracks.chrom_sizes(fai_file)[['seqid', 'length']]
     chrom_sizes = chrom_sizes[
         chrom_sizes['seqid'].str.contains('_mat|_pat')
-    ]
+    ].copy()
     chrom_sizes['base_chrom'] = (
         chrom_sizes['seqid']
         .str.replace("_mat","")
@@ -69,6 +108,7 @@ def plot_chromosome_full(gff_file, fai_file, out_file,
     )
 
     colors = {"Tgut716A":"#d94c8a","Tgut191A":"#5c956f"}
+    blocks = group_repeat_blocks(df)
 
     # — group lengths by chrom+hap —
     grouped = defaultdict(dict)
@@ -98,7 +138,10 @@ def plot_chromosome_full(gff_file, fai_file, out_file,
     hap_spacing = 0.7
     chr_height  = 0.5
 
-    fig, ax = plt.subplots(figsize=(30,15))
+    fig_width, dpi = 30, 300
+    fig, ax = plt.subplots(figsize=(fig_width,15))
+    # bp covered by one output pixel along x
+    merge_bp = max(chrom_sizes['length']) / (fig_width * dpi) if merge_subpixel else 0
     y = 0.0
     label_x_positions = []
     label_y_positions = []
@@ -134,7 +177,6 @@ def plot_chromosome_full(gff_file, fai_file, out_file,
                 hap_id = f"chr{chrom}_{hap}"
                 if hap_id not in grouped[chrom]: continue
                 length = grouped[chrom][hap_id]
-                sub    = df[df['seqid'] == hap_id]
                 y_pos  = y_offset + i * hap_spacing
 
                 ax.add_patch(mpatches.Rectangle(
@@ -143,17 +185,9 @@ def plot_chromosome_full(gff_file, fai_file, out_file,
                     facecolor='gainsboro', edgecolor='black',
                     linewidth=0.5, zorder=0
                 ))
-                for rt in ('Tgut191A','Tgut716A'):
-                    for _, r in sub[sub['repeat']==rt].iterrows():
-                        st = r['start']
-                        seg = max(r['end'] - r['start'], 100_000)
-                        if hap_id in flipped_chromosomes:
-                            st = length - r['end']
-                        ax.add_patch(mpatches.Rectangle(
-                            (x_off + st, y_pos - chr_height/2),
-                            seg, chr_height,
-                            facecolor=colors[rt], edgecolor='none', zorder=2
-                        ))
+                draw_repeat_blocks(ax, blocks, hap_id, x_off, y_pos, length,
+                                   hap_id in flipped_chromosomes, chr_height,
+                                   colors, merge_bp, patches)
                 drew += 1
 
             if drew:
@@ -193,7 +227,6 @@ def plot_chromosome_full(gff_file, fai_file, out_file,
                 hap = avail[0]
                 hap_id = f"chr{chrom}_{hap}"
                 length = grouped[chrom][hap_id]
-                sub    = df[df['seqid'] == hap_id]
                 y_pos  = y + idx_sub * hap_spacing
 
                 ax.add_patch(mpatches.Rectangle(
@@ -202,18 +235,9 @@ def plot_chromosome_full(gff_file, fai_file, out_file,
                     facecolor='lightgray', edgecolor='black',
                     linewidth=0.5, zorder=0
                 ))
-                for rt in ('Tgut191A','Tgut716A'):
-                    for _, r in sub[sub['repeat']==rt].iterrows():
-                        st = r['start']
-                        seg = max(r['end'] - r['start'], 100_000)
-                        if hap_id in flipped_chromosomes:
-                            st = length - r['end']
-                        ax.add_patch(mpatches.Rectangle(
-                            (st, y_pos - chr_height/2),
-                            seg, chr_height,
-                            facecolor=colors[rt], edgecolor='none',
-                            zorder=2
-                        ))
+                draw_repeat_blocks(ax, blocks, hap_id, 0, y_pos, length,
+                                   hap_id in flipped_chromosomes, chr_height,
+                                   colors, merge_bp, patches)
                 label_x_positions.append(0)
                 label_y_positions.append(y_pos)
                 label_names.append(chrom)
@@ -226,7 +250,6 @@ def plot_chromosome_full(gff_file, fai_file, out_file,
             hap_id = f"chr{item}_{hap}"
             if hap_id not in grouped[item]: continue
             length = grouped[item][hap_id]
-            sub    = df[df['seqid'] == hap_id]
             y_pos  = y + i * hap_spacing
 
             ax.add_patch(mpatches.Rectangle(
@@ -235,18 +258,9 @@ def plot_chromosome_full(gff_file, fai_file, out_file,
                 facecolor='lightgray', edgecolor='black',
                 linewidth=0.5, zorder=0
             ))
-            for rt in ('Tgut191A','Tgut716A'):
-                for _, r in sub[sub['repeat']==rt].iterrows():
-                    st = r['start']
-                    seg = max(r['end'] - r['start'], 100_000)
-                    if hap_id in flipped_chromosomes:
-                        st = length - r['end']
-                    ax.add_patch(mpatches.Rectangle(
-                        (st, y_pos - chr_height/2),
-                        seg, chr_height,
-                        facecolor=colors[rt], edgecolor='none',
-                        zorder=2
-                    ))
+            draw_repeat_blocks(ax, blocks, hap_id, 0, y_pos, length,
+                               hap_id in flipped_chromosomes, chr_height,
+                               colors, merge_bp, patches)
             plotted.append(y_pos)
 
         if plotted:
@@ -278,10 +292,10 @@ def plot_chromosome_full(gff_file, fai_file, out_file,
 
     fig = plt.gcf()
     if out_file.lower().endswith('.svg'):
-        fig.savefig(out_file, format='svg', dpi=300,
+        fig.savefig(out_file, format='svg', dpi=dpi,
                     bbox_inches='tight', transparent=True)
     else:
-        fig.savefig(out_file, dpi=300,
+        fig.savefig(out_file, dpi=dpi,
                     bbox_inches='tight', transparent=True)
     plt.close()
 
@@ -299,9 +313,15 @@ if __name__ == '__main__':
                         help="File of chr_hap to flip vertically, one per line.")
     parser.add_argument('--submetacentric',
                         help="File of base chromosome names that are submetacentric.")
+    parser.add_argument('--merge-subpixel', action='store_true',
+                        help="Merge repeat blocks closer than one output pixel before drawing.")
+    parser.add_argument('--patches', action='store_true',
+                        help="Draw one patch per repeat block (slow, previous behavior).")
     args = parser.parse_args()
     plot_chromosome_full(
         args.gff, args.fai, args.out,
         flipped_file=args.flip,
-        submetacentric_file=args.submetacentric
+        submetacentric_file=args.submetacentric,
+        merge_subpixel=args.merge_subpixel,
+        patches=args.patches
     )
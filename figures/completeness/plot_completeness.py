@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import argparse
+import os
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.dates import DateFormatter
@@ -19,29 +21,163 @@ data = """Release date\tCompleteness (%)
 05/09/2022\t96.31
 03/21/2025\t100.00"""
 
-# Load into DataFrame
-df = pd.read_csv(StringIO(data), sep='\t')
-df['Release date'] = pd.to_datetime(df['Release date'], format='%m/%d/%Y')
+TABLE_COLUMNS = ["assembly", "release_date", "source", "source_mtime", "gap_bp", "total_bp", "completeness"]
 
-# Plot
-plt.figure(figsize=(3, 5))
-plt.plot(df['Release date'], df['Completeness (%)'],
-         marker='o', linestyle='--')
 
-# Format axes and labels
-plt.xticks(rotation=45, ha='right')
-plt.xlabel("Release date")
-plt.ylabel("Completeness (%)")
-plt.title("Assembly completeness")
-plt.grid(True)
+def read_manifest(path):
+    """One assembly per line: release date (MM/DD/YYYY), name, then either a gap_stats.sh table,
+    a gap BED and its .fai, or a completeness value (%) for assemblies without gap files."""
+    rows = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            p = line.rstrip("\n").split("\t")
+            rows.append({"release_date": p[0], "assembly": p[1], "source": p[2],
+                         "fai": p[3] if len(p) > 3 else None})
+    return rows
 
-# Date formatting for X axis
-date_fmt = DateFormatter('%m/%d/%Y')
-plt.gca().xaxis.set_major_formatter(date_fmt)
 
-plt.tight_layout()
+def source_mtime(entry):
+    paths = [entry["source"]] + ([entry["fai"]] if entry["fai"] else [])
+    if not all(os.path.exists(p) for p in paths):
+        return 0
+    return max(os.stat(p).st_mtime_ns for p in paths)
 
-# Save as SVG with text preserved
-plt.savefig("completeness_plot.svg", format="svg")
-plt.close()
 
+def is_value(entry):
+    """Whether the source of a manifest entry is a completeness value rather than a gap_stats.sh table."""
+    if entry["fai"] is not None or os.path.exists(entry["source"]):
+        return False
+    try:
+        float(entry["source"])
+    except ValueError:
+        raise FileNotFoundError(f"{entry['assembly']}: {entry['source']} is neither a file nor a completeness value")
+    return True
+
+
+def read_tsv(path, usecols, names):
+    """Headerless TSV columns; an empty file (e.g. a gap BED without gaps) has no rows."""
+    try:
+        return pd.read_csv(path, sep="\t", header=None, usecols=usecols, names=names)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=names)
+
+
+def load_gap_totals(entries):
+    """Gap and sequence bp per assembly, with all tables of one kind read and summed together."""
+    values = [e for e in entries if is_value(e)]
+    stats = [e for e in entries if e["fai"] is None and e not in values]
+    beds = [e for e in entries if e["fai"] is not None]
+    totals = []
+
+    if stats:
+        # gap_stats.sh output: sequence, gap bp, sequence length, gap fraction
+        df = pd.concat([
+            read_tsv(e["source"], [1, 2], ["gap_bp", "total_bp"]).assign(assembly=e["assembly"])
+            for e in stats
+        ])
+        totals.append(df.groupby("assembly", sort=False)[["gap_bp", "total_bp"]].sum())
+
+    if beds:
+        gaps = pd.concat([
+            read_tsv(e["source"], [0, 1, 2], ["seq", "start", "end"]).assign(assembly=e["assembly"])
+            for e in beds
+        ])
+        fais = pd.concat([
+            read_tsv(e["fai"], [0, 1], ["seq", "total_bp"]).assign(assembly=e["assembly"])
+            for e in beds
+        ])
+        # only gaps on sequences of the .fai count, as in gap_stats.sh
+        gaps = gaps.merge(fais[["assembly", "seq"]], on=["assembly", "seq"])
+        gap_bp = (gaps["end"] - gaps["start"]).groupby(gaps["assembly"], sort=False).sum().rename("gap_bp")
+        total_bp = fais.groupby("assembly", sort=False)["total_bp"].sum()
+        totals.append(pd.concat([gap_bp, total_bp], axis=1).fillna(0))
+
+    table = pd.concat(totals) if totals else pd.DataFrame(columns=["gap_bp", "total_bp"])
+    table["completeness"] = 100 * (1 - table["gap_bp"] / table["total_bp"])
+    table = table.reset_index().rename(columns={"index": "assembly"})
+
+    if values:
+        table = pd.concat([table, pd.DataFrame({
+            "assembly": [e["assembly"] for e in values],
+            "gap_bp": pd.NA, "total_bp": pd.NA,
+            "completeness": [float(e["source"]) for e in values],
+        })])
+
+    return table
+
+
+def update_table(manifest, table_path=None):
+    """Aggregated completeness per assembly. With a cached table, only new or changed entries are read."""
+    entries = read_manifest(manifest)
+    for e in entries:
+        e["source_mtime"] = source_mtime(e)
+
+    cached = pd.DataFrame(columns=TABLE_COLUMNS)
+    if table_path and os.path.exists(table_path):
+        cached = pd.read_parquet(table_path)
+
+    known = set(zip(cached["assembly"], cached["source"], cached["source_mtime"]))
+    new = [e for e in entries if (e["assembly"], e["source"], e["source_mtime"]) not in known]
+
+    if new:
+        fresh = load_gap_totals(new)
+        meta = pd.DataFrame(new)[["assembly", "release_date", "source", "source_mtime"]]
+        fresh = meta.merge(fresh, on="assembly")[TABLE_COLUMNS]
+        cached = cached[~cached["assembly"].isin(fresh["assembly"])]
+        cached = pd.concat([cached, fresh], ignore_index=True) if len(cached) else fresh
+
+    # keep only assemblies still listed in the manifest, with their release dates from it
+    table = cached[cached["assembly"].isin([e["assembly"] for e in entries])].reset_index(drop=True)
+    dates = {e["assembly"]: e["release_date"] for e in entries}
+    changed = (table["release_date"] != table["assembly"].map(dates)).any()
+    table["release_date"] = table["assembly"].map(dates)
+    if table_path and (new or changed):
+        table.to_parquet(table_path, index=False)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plot assembly completeness over release dates.")
+    parser.add_argument("--manifest",
+                        help="TSV of release date, assembly, and gap_stats.sh table | gap BED + .fai | completeness (%%); "
+                             "without it, the built-in dataset is plotted")
+    parser.add_argument("--table", help="Cached aggregated table (Parquet); new manifest entries are appended")
+    parser.add_argument("--out", default="completeness_plot.svg", help="Output SVG")
+    args = parser.parse_args()
+
+    if args.manifest:
+        table = update_table(args.manifest, args.table)
+        df = pd.DataFrame({"Release date": table["release_date"], "Completeness (%)": table["completeness"]})
+    else:
+        # Load into DataFrame
+        df = pd.read_csv(StringIO(data), sep='\t')
+    df['Release date'] = pd.to_datetime(df['Release date'], format='%m/%d/%Y')
+    df = df.sort_values('Release date')
+
+    # Plot
+    plt.figure(figsize=(3, 5))
+    plt.plot(df['Release date'], df['Completeness (%)'],
+             marker='o', linestyle='--')
+
+    # Format axes and labels
+    plt.xticks(rotation=45, ha='right')
+    plt.xlabel("Release date")
+    plt.ylabel("Completeness (%)")
+    plt.title("Assembly completeness")
+    plt.grid(True)
+
+    # Date formatting for X axis
+    date_fmt = DateFormatter('%m/%d/%Y')
+    plt.gca().xaxis.set_major_formatter(date_fmt)
+
+    plt.tight_layout()
+
+    # Save as SVG with text preserved
+    plt.savefig(args.out, format="svg")
+    plt.close()
+
+
+if __name__ == "__main__":
+    main()
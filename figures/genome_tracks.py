@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Shared figure data: chromosome sizes from a .fai and satellite units from the repeat GFF.
+
+Repeat units are the GFF lines with a motif name (Target "Motif:X", or GFF3 Target=X),
+of any feature type. Motifs are selected exactly, or with substring=True as contained in
+the motif name (as the grep of the READMEs, which also matches lines that only mention
+the motif in other attributes); requested motifs without units are reported.
+
+Each source is parsed once into compact arrays and cached next to it as
+<source>.tracks.npz. The cache is reused while the source size and mtime are
+unchanged; when only the mtime changed, the content hash decides.
+
+Usage from a figure script (adjust the relative path to figures/):
+  sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+  import genome_tracks
+  sizes = genome_tracks.chrom_sizes("genome.fa.fai")
+  repeats = genome_tracks.repeat_units("repeats.gff", motifs=["Tgut716A", "Tgut191A"])
+
+Run directly to build the caches ahead of time:
+  python genome_tracks.py --fai genome.fa.fai --gff repeats.gff
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 2
+# Target "Motif:Tgut716A" 1 80 (RepeatMasker) or Target=Tgut716A 1 80 (GFF3)
+MOTIF_RE = re.compile(r'Motif:([^"\s;]+)|Target="?(?!Motif:)([^"\s;]+)')
+HAP_RE = re.compile(r'_(mat|pat)$')
+
+
+def _file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_path(source, cache_dir=None):
+    if cache_dir:
+        return os.path.join(cache_dir, os.path.basename(source) + ".tracks.npz")
+    return source + ".tracks.npz"
+
+
+def _cached(source, parse, cache_dir=None):
+    """Arrays parsed from source, served from the .npz cache when it is still valid."""
+    path = _cache_path(source, cache_dir)
+    st = os.stat(source)
+    if os.path.exists(path):
+        with np.load(path) as cache:
+            arrays = dict(cache)
+        if int(arrays["_version"]) == CACHE_VERSION and int(arrays["_size"]) == st.st_size:
+            if int(arrays["_mtime_ns"]) == st.st_mtime_ns:
+                return arrays
+            if str(arrays["_sha1"]) == _file_hash(source):
+                arrays["_mtime_ns"] = np.int64(st.st_mtime_ns)
+                _save(path, arrays)
+                return arrays
+
+    arrays = parse(source)
+    arrays["_version"] = np.int64(CACHE_VERSION)
+    arrays["_size"] = np.int64(st.st_size)
+    arrays["_mtime_ns"] = np.int64(st.st_mtime_ns)
+    arrays["_sha1"] = np.array(_file_hash(source))
+    _save(path, arrays)
+    return arrays
+
+
+def _save(path, arrays):
+    # the cache is only an optimization, read-only locations are fine
+    try:
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+    except OSError as e:
+        sys.stderr.write(f"[genome_tracks] could not write cache {path}: {e}\n")
+
+
+def _parse_fai(path):
+    seqids, lengths = [], []
+    with open(path) as f:
+        for line in f:
+            p = line.rstrip("\n").split("\t")
+            if len(p) < 2:
+                continue
+            seqids.append(p[0])
+            lengths.append(int(p[1]))
+    return {"seqid": np.array(seqids, dtype=str), "length": np.array(lengths, dtype=np.int64)}
+
+
+def motif_name(attributes):
+    """Motif of a GFF attribute column (None without a Target)."""
+    m = MOTIF_RE.search(attributes)
+    return (m.group(1) or m.group(2)) if m else None
+
+
+def _parse_repeat_gff(path):
+    seqid_codes, motif_codes, type_codes = {}, {}, {}
+    seqid, motif, ftype, start, end = [], [], [], [], []
+    with open(path) as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            p = line.rstrip("\n").split("\t")
+            if len(p) < 9:
+                continue
+            name = motif_name(p[8])
+            if name is None:
+                continue
+            seqid.append(seqid_codes.setdefault(p[0], len(seqid_codes)))
+            motif.append(motif_codes.setdefault(name, len(motif_codes)))
+            ftype.append(type_codes.setdefault(p[2], len(type_codes)))
+            start.append(int(p[3]))
+            end.append(int(p[4]))
+    return {
+        "seqids": np.array(list(seqid_codes), dtype=str),
+        "motifs": np.array(list(motif_codes), dtype=str),
+        "types": np.array(list(type_codes), dtype=str),
+        "seqid": np.array(seqid, dtype=np.int32),
+        "motif": np.array(motif, dtype=np.int32),
+        "type": np.array(ftype, dtype=np.int32),
+        "start": np.array(start, dtype=np.int64),
+        "end": np.array(end, dtype=np.int64),
+    }
+
+
+def haplotype(seqids):
+    """'mat'/'pat' from the _mat/_pat suffix, NaN for unphased sequences."""
+    return pd.Series(seqids).str.extract(HAP_RE, expand=False)
+
+
+def chrom_sizes(fai_file, cache_dir=None):
+    """DataFrame with seqid, length and haplotype for every sequence in the .fai."""
+    arrays = _cached(fai_file, _parse_fai, cache_dir)
+    df = pd.DataFrame({"seqid": arrays["seqid"], "length": arrays["length"]})
+    df["haplotype"] = haplotype(df["seqid"])
+    return df
+
+
+def repeat_units(gff_file, motifs=None, feature_type=None, substring=False, cache_dir=None):
+    """DataFrame with seqid, haplotype, motif, start and end (GFF coordinates) of repeat units.
+
+    With motifs, units are labeled with the first requested motif their motif name equals
+    (or contains, with substring).
+    """
+    arrays = _cached(gff_file, _parse_repeat_gff, cache_dir)
+    keep = np.ones(len(arrays["start"]), dtype=bool)
+    if feature_type is not None:
+        keep &= np.isin(arrays["type"], np.flatnonzero(arrays["types"] == feature_type))
+    if motifs is None:
+        motif = pd.Categorical.from_codes(arrays["motif"][keep], categories=arrays["motifs"])
+    else:
+        motifs = list(dict.fromkeys(motifs))
+        label = np.full(len(arrays["motifs"]), -1, dtype=np.int64)
+        for i, wanted in enumerate(motifs):
+            hit = np.array([wanted in m if substring else wanted == m for m in arrays["motifs"]], dtype=bool)
+            label[hit & (label < 0)] = i
+        codes = label[arrays["motif"]]
+        keep &= codes >= 0
+        counts = np.bincount(codes[keep], minlength=len(motifs))
+        for wanted, n in zip(motifs, counts):
+            if n == 0:
+                sys.stderr.write(f"[genome_tracks] no units of motif {wanted} in {gff_file}\n")
+        motif = pd.Categorical.from_codes(codes[keep], categories=motifs)
+    seqids = pd.Categorical.from_codes(arrays["seqid"][keep], categories=arrays["seqids"])
+    df = pd.DataFrame({
+        "seqid": seqids,
+        "motif": motif,
+        "start": arrays["start"][keep],
+        "end": arrays["end"][keep],
+    })
+    hap = haplotype(arrays["seqids"])
+    df.insert(1, "haplotype", hap.to_numpy()[arrays["seqid"][keep]])
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the cached figure data for a .fai and/or repeat GFF.")
+    parser.add_argument("--fai", help="FASTA index with chromosome sizes")
+    parser.add_argument("--gff", help="Repeat GFF with Target \"Motif:X\" (RepeatMasker) or Target=X (GFF3) units")
+    parser.add_argument("--cache-dir", help="Directory for the .tracks.npz files (default: next to the sources)")
+    args = parser.parse_args()
+
+    if args.fai:
+        print(f"{len(chrom_sizes(args.fai, args.cache_dir))} sequences cached for {args.fai}")
+    if args.gff:
+        units = repeat_units(args.gff, cache_dir=args.cache_dir)
+        print(f"{len(units)} repeat units cached for {args.gff}")
+        print(units["motif"].value_counts().to_string())
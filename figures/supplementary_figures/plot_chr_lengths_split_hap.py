@@ -2,45 +2,59 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import argparse
+import os
+import sys
 
-def load_fai_with_haplotypes(fai_path):
-    df = pd.read_csv(fai_path, sep='\t', header=None, usecols=[0, 1], names=['chr', 'length'])
-    df['hap'] = df['chr'].str.extract(r'_(mat|pat)$')[0]
-    df['chr_base'] = df['chr'].str.replace(r'_(mat|pat)$', '', regex=True)
-    return df[['chr_base', 'hap', 'length']]
-
-def main(fai_path, output):
-    df = load_fai_with_haplotypes(fai_path)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import genome_tracks
 
-    # Pivot to get one row per chromosome with mat/pat columns
-    pivot = df.pivot_table(index='chr_base', columns='hap', values='length', aggfunc='sum').fillna(0)
+def load_fai_with_haplotypes(fai_path):
+    df = genome_tracks.chrom_sizes(fai_path).rename(columns={'seqid': 'chr'})
+    parts = df['chr'].str.extract(r'^(?P<chr_base>.+?)(?:_(?P<hap>mat|pat))?$')
+    return pd.concat([parts, df['length']], axis=1)
 
-    # Ensure both columns exist
-    for hap in ['mat', 'pat']:
-        if hap not in pivot.columns:
-            pivot[hap] = 0
+def diploid_lengths(fai_paths, labels):
+    """One row per chromosome, (assembly, hap) columns, sorted by diploid-equivalent length."""
+    df = pd.concat([load_fai_with_haplotypes(p).assign(assembly=l) for p, l in zip(fai_paths, labels)])
+    pivot = df.pivot_table(index='chr_base', columns=['assembly', 'hap'], values='length',
+                           aggfunc='sum', fill_value=0)
+    pivot = pivot.reindex(columns=pd.MultiIndex.from_product([labels, ['mat', 'pat']]), fill_value=0)
 
-    # For sorting: use diploid-equivalent length
-    def compute_diploid_length(row):
-        if row['mat'] > 0 and row['pat'] > 0:
-            return row['mat'] + row['pat']
-        else:
-            return 2 * max(row['mat'], row['pat'])
+    # For sorting: use diploid-equivalent length (twice the single haplotype when the other is missing),
+    # the largest across assemblies
+    mat = pivot.xs('mat', axis=1, level=1).to_numpy()
+    pat = pivot.xs('pat', axis=1, level=1).to_numpy()
+    diploid = np.where((mat > 0) & (pat > 0), mat + pat, 2 * np.maximum(mat, pat))
+    pivot['sort_total'] = diploid.max(axis=1)
+    return pivot.sort_values('sort_total', ascending=False).drop(columns='sort_total', level=0)
 
-    pivot['sort_total'] = pivot.apply(compute_diploid_length, axis=1)
-    pivot = pivot.sort_values('sort_total', ascending=False).drop(columns='sort_total')
+def main(fai_paths, output, labels=None):
+    if isinstance(fai_paths, str):
+        fai_paths = [fai_paths]
+    labels = labels or [os.path.basename(p).removesuffix('.fai') for p in fai_paths]
+    pivot = diploid_lengths(fai_paths, labels)
 
-    # Extract sorted labels and values
+    # Extract sorted labels and values, one row per (assembly, haplotype) series
     chroms = pivot.index.tolist()
     x = np.arange(len(chroms))
-    bar_width = 0.4
-    mat_vals = pivot['mat'].values
-    pat_vals = pivot['pat'].values
+    values = pivot.to_numpy().T
+    series = pivot.columns.tolist()
+    bar_width = 0.8 / len(series)
+    offsets = (np.arange(len(series)) - (len(series) - 1) / 2) * bar_width
+
+    if len(labels) == 1:
+        names = {'mat': 'Maternal', 'pat': 'Paternal'}
+        series_labels = [names[hap] for _, hap in series]
+        colors = ['skyblue', 'steelblue']
+    else:
+        cmap = plt.get_cmap('tab20')
+        series_labels = [f'{asm} {hap}' for asm, hap in series]
+        colors = [cmap(i % 20) for i in range(len(series))]
 
     # Plot
     fig, ax = plt.subplots(figsize=(16, 5))
-    ax.bar(x - bar_width/2, mat_vals, width=bar_width, label='Maternal', color='skyblue')
-    ax.bar(x + bar_width/2, pat_vals, width=bar_width, label='Paternal', color='steelblue')
+    for vals, off, label, color in zip(values, offsets, series_labels, colors):
+        ax.bar(x + off, vals, width=bar_width, label=label, color=color)
 
     ax.set_xticks(x)
     ax.set_xticklabels(chroms, rotation=90)
@@ -59,8 +73,11 @@ def main(fai_path, output):
     print(f"[INFO] Saved plot to {output}")
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Plot haplotype-resolved chromosome lengths from single .fai")
-    parser.add_argument("fai", help=".fai file with _mat and _pat chromosomes")
+    parser = argparse.ArgumentParser(description="Plot haplotype-resolved chromosome lengths from one or more .fai")
+    parser.add_argument("fai", nargs="+", help=".fai file(s) with _mat and _pat chromosomes, one per assembly")
+    parser.add_argument("-l", "--labels", nargs="+", help="Assembly labels, one per .fai (default: file names)")
     parser.add_argument("-o", "--output", default="chr_lengths_split.png", help="Output PNG file")
     args = parser.parse_args()
-    main(args.fai, args.output)
+    if args.labels and len(args.labels) != len(args.fai):
+        parser.error("--labels needs one label per .fai")
+    main(args.fai, args.output, args.labels)
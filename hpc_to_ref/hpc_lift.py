@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Lift coordinates between the homopolymer-compressed (HPC) and the uncompressed reference.
+
+The index is built in one pass over the uncompressed FASTA: for every sequence it stores
+the base-space start of each HPC position (uint32, <fasta>.hpc.bin, memory-mapped) and
+a table of sequence names, offsets and lengths (<fasta>.hpc.idx). HPC intervals from
+BED, GFF or GAF files (e.g. features or alignments on the HPC sequence or utigs) are then
+lifted in vectorized batches, without recompressing, re-indexing or realigning.
+
+Lifted GAF records describe the same alignment in the other space, so the fields that
+depend on its exact columns cannot be kept: the cg:Z, cs:Z and ds:Z tags are dropped,
+the alignment block length becomes the longer of the query and path spans, and the
+residue matches (counted in the input space) are capped at it.
+
+Usage:
+  python hpc_lift.py index chrZ_pat.fasta
+  python hpc_lift.py lift chrZ_pat.fasta hpc_features.bed -o features.bed
+  python hpc_lift.py lift chrZ_pat.fasta alignments.gaf -o alignments.base.gaf
+  python hpc_lift.py lift chrZ_pat.fasta features.gff --to-hpc -o features.hpc.gff
+"""
+import argparse
+import gzip
+import os
+import sys
+from itertools import islice
+
+import numpy as np
+
+# 0-based (start, end) columns lifted per format, and whether the file is 1-based closed (GFF)
+FORMATS = {
+    "bed": (((1, 2), (6, 7)), False),   # chromStart/End, and thickStart/End when present
+    "gff": (((3, 4),), True),
+    "gaf": (((7, 8),), False),          # path start/end, on single-sequence paths
+}
+EXTENSIONS = {".bed": "bed", ".gff": "gff", ".gff3": "gff", ".gtf": "gff", ".gaf": "gaf"}
+CHUNK_LINES = 500000
+# GAF tags describing the alignment columns, dropped after lifting
+GAF_ALIGNMENT_TAGS = ("cg:Z:", "cs:Z:", "ds:Z:")
+
+
+def open_text(path):
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt")
+    return open(path)
+
+
+def read_fasta(path):
+    """(name, uppercase sequence bytes) per record."""
+    name, chunks = None, []
+    with open_text(path) as f:
+        for line in f:
+            if line.startswith(">"):
+                if name is not None:
+                    yield name, "".join(chunks).upper().encode()
+                name, chunks = line[1:].split()[0], []
+            else:
+                chunks.append(line.strip())
+    if name is not None:
+        yield name, "".join(chunks).upper().encode()
+
+
+def build_index(fasta, prefix=None):
+    """Write <prefix>.hpc.bin and <prefix>.hpc.idx (prefix defaults to the FASTA path)."""
+    prefix = prefix or fasta
+    offset = 0
+    with open(prefix + ".hpc.bin.tmp", "wb") as out, open(prefix + ".hpc.idx.tmp", "w") as idx:
+        idx.write("#name\toffset\thpc_length\tlength\n")
+        for name, seq in read_fasta(fasta):
+            if len(seq) >= 2 ** 32:
+                raise ValueError(f"{name}: sequences of 4 Gbp or longer are not supported")
+            arr = np.frombuffer(seq, dtype=np.uint8)
+            # a new HPC position starts wherever the base differs from the previous one
+            starts = np.flatnonzero(np.concatenate([[True], arr[1:] != arr[:-1]])) if len(arr) else np.zeros(0)
+            out.write(starts.astype("<u4").tobytes())
+            idx.write(f"{name}\t{offset}\t{len(starts)}\t{len(arr)}\n")
+            offset += len(starts)
+    os.replace(prefix + ".hpc.bin.tmp", prefix + ".hpc.bin")
+    os.replace(prefix + ".hpc.idx.tmp", prefix + ".hpc.idx")
+    return offset
+
+
+class HpcIndex:
+    """Memory-mapped HPC <-> base coordinate index of one FASTA."""
+
+    def __init__(self, fasta, prefix=None):
+        prefix = prefix or fasta
+        stale = not os.path.exists(prefix + ".hpc.idx") or (
+            os.path.exists(fasta) and os.path.getmtime(fasta) > os.path.getmtime(prefix + ".hpc.idx"))
+        if stale:
+            sys.stderr.write(f"[INFO] Building HPC index for {fasta}\n")
+            build_index(fasta, prefix)
+        self.seqs = {}
+        with open(prefix + ".hpc.idx") as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                name, offset, hpc_len, length = line.rstrip("\n").split("\t")
+                self.seqs[name] = (int(offset), int(hpc_len), int(length))
+        total = sum(hpc_len for _, hpc_len, _ in self.seqs.values())
+        self.starts = np.memmap(prefix + ".hpc.bin", dtype="<u4", mode="r", shape=(total,)) if total else np.zeros(0, "<u4")
+
+    def _starts(self, name):
+        offset, hpc_len, length = self.seqs[name]
+        return self.starts[offset:offset + hpc_len], hpc_len, length
+
+    def to_base(self, name, hpc_pos):
+        """Base-space positions of 0-based HPC boundaries (0..hpc_length)."""
+        starts, hpc_len, length = self._starts(name)
+        hpc_pos = np.asarray(hpc_pos, dtype=np.int64)
+        if len(hpc_pos) and (hpc_pos.min() < 0 or hpc_pos.max() > hpc_len):
+            raise ValueError(f"{name}: HPC coordinate outside 0-{hpc_len}")
+        inside = hpc_pos < hpc_len
+        return np.where(inside, starts[np.where(inside, hpc_pos, 0)].astype(np.int64) if hpc_len else 0, length)
+
+    def to_hpc(self, name, pos, end=False):
+        """HPC positions of 0-based base boundaries; interval ends are rounded up to the whole run.
+
+        The sequence end maps to hpc_length either way, so empty intervals there round trip.
+        """
+        starts, hpc_len, length = self._starts(name)
+        pos = np.asarray(pos, dtype=np.int64)
+        if len(pos) and (pos.min() < 0 or pos.max() > length):
+            raise ValueError(f"{name}: coordinate outside 0-{length}")
+        if end:
+            return np.searchsorted(starts, pos, side="left")
+        if not hpc_len:
+            return pos
+        return np.where(pos == length, hpc_len, np.searchsorted(starts, pos, side="right") - 1)
+
+
+def gaf_target(fields):
+    """Sequence name and strand of a single-sequence GAF path (None for multi-segment paths)."""
+    path = fields[5]
+    if path[0] in "<>":
+        if path.count("<") + path.count(">") > 1:
+            return None, None
+        return path[1:], path[0]
+    return path, ">"
+
+
+def is_sub_interval(fields, outer, inner):
+    """Whether the inner columns are integer coordinates inside the interval of the outer columns."""
+    values = [fields[c] for c in outer + inner]
+    if not all(v.isdigit() for v in values):
+        return False
+    start, end, sub_start, sub_end = map(int, values)
+    return start <= sub_start <= sub_end <= end
+
+
+def lift_chunk(index, lines, fmt, to_hpc=False):
+    """Lift the coordinate columns of a batch of lines; returns the output lines and the number left unchanged."""
+    pairs, one_based = FORMATS[fmt]
+    rows = [line.rstrip("\n").split("\t") for line in lines]
+    groups = {}
+    n_data = 0
+    for i, r in enumerate(rows):
+        if r[0].startswith(("#", "track", "browser")) or len(r) <= pairs[0][1]:
+            continue
+        n_data += 1
+        name, strand = gaf_target(r) if fmt == "gaf" else (r[0], ">")
+        if name is None or name not in index.seqs:
+            continue
+        groups.setdefault((name, strand), []).append(i)
+
+    n_lifted = 0
+    for (name, strand), rows_idx in groups.items():
+        _, hpc_len, length = index.seqs[name]
+        src_len, dst_len = (length, hpc_len) if to_hpc else (hpc_len, length)
+        n_lifted += len(rows_idx)
+        # optional columns (BED thickStart/End) only when they are coordinates within the interval,
+        # other BED6+ columns pass through unchanged; checked before anything is lifted
+        lifted_rows = [[i for i in rows_idx
+                        if len(rows[i]) > c_end and (not k or is_sub_interval(rows[i], pairs[0], (c_start, c_end)))]
+                       for k, (c_start, c_end) in enumerate(pairs)]
+        for (c_start, c_end), idx in zip(pairs, lifted_rows):
+            start = np.array([int(rows[i][c_start]) for i in idx], dtype=np.int64)
+            end = np.array([int(rows[i][c_end]) for i in idx], dtype=np.int64)
+            if one_based:
+                start -= 1
+            if strand == "<":
+                # coordinates on the reverse strand of the path
+                start, end = src_len - end, src_len - start
+            if to_hpc:
+                new_start, new_end = index.to_hpc(name, start), index.to_hpc(name, end, end=True)
+            else:
+                new_start, new_end = index.to_base(name, start), index.to_base(name, end)
+            if strand == "<":
+                new_start, new_end = dst_len - new_end, dst_len - new_start
+            if one_based:
+                new_start += 1
+            for i, s, e in zip(idx, new_start.tolist(), new_end.tolist()):
+                rows[i][c_start], rows[i][c_end] = str(s), str(e)
+        if fmt == "gaf":
+            for i in rows_idx:
+                r = rows[i]
+                r[6] = str(dst_len)
+                block = max(int(r[3]) - int(r[2]), int(r[8]) - int(r[7]))
+                r[9], r[10] = str(min(int(r[9]), block)), str(block)
+                r[12:] = [tag for tag in r[12:] if not tag.startswith(GAF_ALIGNMENT_TAGS)]
+
+    return ["\t".join(r) + "\n" for r in rows], n_data - n_lifted
+
+
+def lift_file(index, path, out, fmt, to_hpc=False):
+    n_skipped = 0
+    with open_text(path) as f:
+        while True:
+            lines = list(islice(f, CHUNK_LINES))
+            if not lines:
+                break
+            lifted, skipped = lift_chunk(index, lines, fmt, to_hpc)
+            out.writelines(lifted)
+            n_skipped += skipped
+    return n_skipped
+
+
+def guess_format(path):
+    base = path[:-3] if path.endswith(".gz") else path
+    return EXTENSIONS.get(os.path.splitext(base)[1].lower())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HPC <-> uncompressed coordinate lift-over from a FASTA index.")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    p_index = sub.add_parser("index", help="Build the HPC index of an (uncompressed) FASTA")
+    p_index.add_argument("fasta")
+    p_lift = sub.add_parser("lift", help="Lift HPC intervals to base space (or back with --to-hpc)")
+    p_lift.add_argument("fasta", help="Uncompressed FASTA (indexed on first use)")
+    p_lift.add_argument("intervals", help="BED, GFF or GAF file (plain or gz)")
+    p_lift.add_argument("-f", "--format", choices=sorted(FORMATS), help="Input format (default: from the extension)")
+    p_lift.add_argument("--to-hpc", action="store_true", help="Lift base-space intervals to HPC coordinates")
+    p_lift.add_argument("-o", "--output", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    if args.mode == "index":
+        n = build_index(args.fasta)
+        print(f"[INFO] Indexed {n} HPC positions of {args.fasta}")
+        sys.exit(0)
+
+    fmt = args.format or guess_format(args.intervals)
+    if fmt is None:
+        parser.error("cannot guess the format from the file name, use --format")
+    index = HpcIndex(args.fasta)
+    out = open(args.output, "w") if args.output else sys.stdout
+    skipped = lift_file(index, args.intervals, out, fmt, args.to_hpc)
+    if args.output:
+        out.close()
+    if skipped:
+        sys.stderr.write(f"[WARN] {skipped} lines left unchanged (unknown sequence or multi-segment GAF path)\n")
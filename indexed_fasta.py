@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Shared random access to uncompressed FASTAs through their .fai index and a read-only memory map.
+
+The .fai is built in one pass if missing (samtools faidx-compatible), so the scripts
+that slice a genome do not need samtools.
+
+Usage from a script (adjust the relative path to the repository root):
+  sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+  from indexed_fasta import IndexedFasta, reverse_complement
+  genome = IndexedFasta("genome.fasta")
+  seq = genome.fetch("chr1_mat", 1000, 2000)
+
+Run directly to index FASTAs ahead of time:
+  python indexed_fasta.py genome.fasta tangles.fasta
+"""
+import argparse
+import mmap
+import os
+import sys
+
+# IUPAC complement for reverse complementing raw FASTA bytes
+COMPLEMENT = bytes.maketrans(b"ACGTNacgtnRYKMBVDHrykmbvdh", b"TGCANtgcanYRMKVBHDyrmkvbhd")
+
+
+def reverse_complement(seq):
+    return seq.translate(COMPLEMENT)[::-1]
+
+
+def write_fai(path, fai_path=None):
+    """samtools faidx-compatible index of an uncompressed FASTA, in one pass."""
+    with open(path, "rb") as f, open(fai_path or path + ".fai", "w") as out:
+        name = None
+        pos = 0
+        for line in f:
+            if line.startswith(b">"):
+                if name is not None:
+                    out.write(f"{name}\t{length}\t{offset}\t{line_bases}\t{line_width}\n")
+                name = line[1:].split()[0].decode()
+                length, offset, line_bases, line_width = 0, pos + len(line), 0, 0
+            else:
+                n = len(line.rstrip(b"\r\n"))
+                if line_bases == 0:
+                    line_bases, line_width = n, len(line)
+                length += n
+            pos += len(line)
+        if name is not None:
+            out.write(f"{name}\t{length}\t{offset}\t{line_bases}\t{line_width}\n")
+
+
+class IndexedFasta:
+    """Uncompressed FASTA with a .fai index (built if missing), memory-mapped.
+
+    fetch() clips intervals to the sequence, or raises ValueError outside it when strict.
+    """
+
+    def __init__(self, path, fai_path=None, strict=False):
+        self.path = path
+        self.strict = strict
+        fai_path = fai_path or path + ".fai"
+        if not os.path.exists(fai_path):
+            sys.stderr.write(f"[INFO] Indexing {path}\n")
+            write_fai(path, fai_path)
+        self.index = {}
+        with open(fai_path) as f:
+            for line in f:
+                name, length, offset, line_bases, line_width = line.split("\t")[:5]
+                self.index[name] = (int(length), int(offset), int(line_bases), int(line_width))
+        self._file = open(path, "rb")
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.mm.close()
+        self._file.close()
+
+    def length(self, name):
+        return self.index[name][0]
+
+    def fetch(self, name, start, end):
+        """Sequence bytes of the 0-based half-open interval."""
+        length, offset, line_bases, line_width = self.index[name]
+        if self.strict and not 0 <= start <= end <= length:
+            raise ValueError(f"{name}:{start + 1}-{end} is outside 1-{length}")
+        start, end = max(start, 0), min(end, length)
+        if start >= end:
+            return b""
+        first = offset + start // line_bases * line_width + start % line_bases
+        last = offset + (end - 1) // line_bases * line_width + (end - 1) % line_bases + 1
+        return self.mm[first:last].replace(b"\n", b"").replace(b"\r", b"")
+
+    def record(self, name):
+        """Raw bytes of the whole record (header and wrapped sequence)."""
+        offset = self.index[name][1]
+        header = self.mm.rfind(b">", 0, offset)
+        end = self.mm.find(b"\n>", offset)
+        return self.mm[header:len(self.mm) if end < 0 else end + 1]
+
+    def header(self, name):
+        """Raw header line of the record, with its newline."""
+        offset = self.index[name][1]
+        return self.mm[self.mm.rfind(b">", 0, offset):offset]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build samtools faidx-compatible .fai indexes of uncompressed FASTAs.")
+    parser.add_argument("fasta", nargs="+", help="Uncompressed FASTA files")
+    args = parser.parse_args()
+    for path in args.fasta:
+        write_fai(path)
+        print(f"[INFO] Saved {path}.fai")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Apply a patch specification to an indexed FASTA (and Verkko paths), rewriting only the patched sequences.
+
+Patch specification (TSV, '#' comments), one edit per line; sequence coordinates are
+1-based and inclusive, as in region strings (chr32_mat:268981-269120), and always refer
+to the unpatched sequence:
+
+  replace  <seq>  <start>  <end>  <replacement>
+      <replacement> is a region of the base or a --sources FASTA (name:start-end, with
+      :- appended for the reverse complement), N<length> for a gap, a literal sequence,
+      or . to delete. Use end = start - 1 to insert before start.
+  splice   <seq>  <left t_start> <left t_size>  <right t_start>  <source>  <left q_start> <left q_size>  <right q_start>
+      Close a gap from the flanking alignments of <source> (lastal/MAF 0-based start and
+      size): keeps <seq> up to the end of the left alignment, takes <source> from the end
+      of its left alignment to the start of its right alignment, and resumes <seq> at the
+      start of the right alignment.
+  path     <path name>  <patch path>
+      Replace the part of a Verkko path (--paths) between the first and last node of the
+      patch path (e.g. >utig4-1037...<utig4-2418) by the patch.
+
+Unpatched sequences are copied byte for byte from the memory-mapped FASTA. A shift
+table (<output>.shifts.tsv) maps the kept blocks of every patched sequence to their new
+coordinates, and --annotations GFF/BED files are lifted alongside (features overlapping
+an edit are dropped and reported).
+
+Usage:
+  python patch_fasta.py assembly.fasta patches.tsv -o assembly.patched.fasta --sources tangles.fasta --annotations genes.gff
+"""
+import argparse
+import bisect
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from indexed_fasta import IndexedFasta, reverse_complement
+
+REGION_RE = re.compile(r"^(?P<name>.+):(?P<start>[\d,]+)-(?P<end>[\d,]+)(?::(?P<strand>[+-]))?$")
+GAP_RE = re.compile(r"^N(\d+)$")
+NODE_RE = re.compile(r"[<>][^<>\[]+|\[[^\]]*\]")
+
+
+def read_spec(path):
+    """Sequence edits per sequence as (start, end, replacement) with 0-based half-open coordinates,
+    and path edits as (path name, patch path)."""
+    edits, path_edits = {}, []
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip() or line.startswith("#"):
+                continue
+            p = line.split()
+            op = p[0]
+            if op == "replace" and len(p) == 5:
+                seq, start, end, repl = p[1], int(p[2]) - 1, int(p[3]), p[4]
+            elif op == "splice" and len(p) == 9:
+                seq = p[1]
+                start, end = int(p[2]) + int(p[3]), int(p[4])
+                q_start, q_end = int(p[6]) + int(p[7]), int(p[8])
+                repl = f"{p[5]}:{q_start + 1}-{q_end}"
+            elif op == "path" and len(p) == 3:
+                path_edits.append((p[1], p[2]))
+                continue
+            else:
+                raise ValueError(f"{path}:{n}: cannot parse patch line: {line.strip()}")
+            if end < start:
+                raise ValueError(f"{path}:{n}: end before start")
+            edits.setdefault(seq, []).append((start, end, repl))
+
+    for seq, seq_edits in edits.items():
+        # insertions at the same position stay in specification order
+        seq_edits.sort(key=lambda e: (e[0], e[1]))
+        for (s1, e1, _), (s2, e2, _) in zip(seq_edits, seq_edits[1:]):
+            if s2 < e1:
+                raise ValueError(f"{seq}: overlapping edits at {s1 + 1}-{e1} and {s2 + 1}-{e2}")
+    return edits, path_edits
+
+
+def replacement_bytes(repl, fastas):
+    if repl == ".":
+        return b""
+    m = GAP_RE.match(repl)
+    if m:
+        return b"N" * int(m.group(1))
+    m = REGION_RE.match(repl)
+    if m:
+        name = m.group("name")
+        fasta = next((fa for fa in fastas if name in fa.index), None)
+        if fasta is None:
+            raise ValueError(f"{name} is not in the base or source FASTAs")
+        seq = fasta.fetch(name, int(m.group("start").replace(",", "")) - 1, int(m.group("end").replace(",", "")))
+        return reverse_complement(seq) if m.group("strand") == "-" else seq
+    if re.fullmatch(r"[ACGTNacgtnRYKMBVDHrykmbvdh]+", repl):
+        return repl.encode()
+    raise ValueError(f"cannot interpret replacement {repl}")
+
+
+def patch_sequence(fasta, name, edits, sources):
+    """Patched sequence and the kept blocks as (old_start, old_end, new_start)."""
+    pieces, blocks = [], []
+    pos = new_pos = 0
+    for start, end, repl in edits:
+        if end > fasta.length(name):
+            raise ValueError(f"{name}: edit {start + 1}-{end} is past the end ({fasta.length(name)})")
+        pieces.append(fasta.fetch(name, pos, start))
+        blocks.append((pos, start, new_pos))
+        new_pos += start - pos
+        seq = replacement_bytes(repl, [fasta] + sources)
+        pieces.append(seq)
+        new_pos += len(seq)
+        pos = end
+    pieces.append(fasta.fetch(name, pos, fasta.length(name)))
+    blocks.append((pos, fasta.length(name), new_pos))
+    return b"".join(pieces), [b for b in blocks if b[1] > b[0]]
+
+
+def write_fasta_record(out, header, seq, width):
+    out.write(header)
+    for i in range(0, len(seq), width):
+        out.write(seq[i:i + width])
+        out.write(b"\n")
+
+
+def patch_fasta(fasta, edits, sources, output, changed_only=False):
+    """Write the patched FASTA; returns the kept blocks of every patched sequence."""
+    missing = set(edits) - set(fasta.index)
+    if missing:
+        raise ValueError(f"sequences not in {fasta.path}: {', '.join(sorted(missing))}")
+    shifts = {}
+    with open(output, "wb") as out:
+        for name in fasta.index:
+            if name not in edits:
+                if not changed_only:
+                    out.write(fasta.record(name))
+                continue
+            seq, blocks = patch_sequence(fasta, name, edits[name], sources)
+            width = fasta.index[name][2] or 60
+            write_fasta_record(out, fasta.header(name), seq, width)
+            shifts[name] = blocks
+            sys.stderr.write(f"[INFO] {name}: {fasta.length(name)} -> {len(seq)} bp ({len(edits[name])} edits)\n")
+    return shifts
+
+
+def write_shifts(shifts, path):
+    with open(path, "w") as out:
+        out.write("#seq\told_start\told_end\tnew_start\tnew_end\n")
+        for name, blocks in shifts.items():
+            for old_start, old_end, new_start in blocks:
+                out.write(f"{name}\t{old_start}\t{old_end}\t{new_start}\t{new_start + old_end - old_start}\n")
+
+
+def lift_annotations(path, out_path, shifts):
+    """Shift GFF/BED features on patched sequences; features overlapping an edit are dropped."""
+    one_based = not path.lower().endswith(".bed")
+    cols = (3, 4) if one_based else (1, 2)
+    starts = {name: [b[0] for b in blocks] for name, blocks in shifts.items()}
+    kept = dropped = 0
+    with open(path) as f, open(out_path, "w") as out:
+        for line in f:
+            p = line.rstrip("\n").split("\t")
+            if line.startswith(("#", "track", "browser")) or len(p) <= cols[1] or p[0] not in shifts:
+                out.write(line)
+                continue
+            start, end = int(p[cols[0]]) - one_based, int(p[cols[1]])
+            blocks = shifts[p[0]]
+            i = bisect.bisect_right(starts[p[0]], start) - 1
+            if i < 0 or end > blocks[i][1]:
+                dropped += 1
+                continue
+            delta = blocks[i][2] - blocks[i][0]
+            p[cols[0]], p[cols[1]] = str(int(p[cols[0]]) + delta), str(end + delta)
+            if not one_based and len(p) > 7 and p[6].isdigit() and p[7].isdigit():
+                p[6], p[7] = str(max(int(p[6]) + delta, 0)), str(int(p[7]) + delta)
+            out.write("\t".join(p) + "\n")
+            kept += 1
+    return kept, dropped
+
+
+def patch_path(path, patch):
+    """Replace the segment of a Verkko path between the patch's first and last node by the patch."""
+    nodes = NODE_RE.findall(path)
+    patch_nodes = NODE_RE.findall(patch)
+    first, last = patch_nodes[0], patch_nodes[-1]
+    if first not in nodes or last not in nodes:
+        raise ValueError(f"patch ends {first} and {last} are not both in the path")
+    i = nodes.index(first)
+    j = len(nodes) - 1 - nodes[::-1].index(last)
+    if j < i:
+        raise ValueError(f"{last} comes before {first} in the path")
+    return "".join(nodes[:i] + patch_nodes + nodes[j + 1:])
+
+
+def patch_paths(paths_file, path_edits, out_path):
+    """Apply the path edits to a Verkko paths TSV (name, path, assignment)."""
+    edits = {}
+    for name, patch in path_edits:
+        edits.setdefault(name, []).append(patch)
+    done = set()
+    with open(paths_file) as f, open(out_path, "w") as out:
+        for line in f:
+            p = line.rstrip("\n").split("\t")
+            if len(p) > 1 and p[0] in edits:
+                for patch in edits[p[0]]:
+                    p[1] = patch_path(p[1], patch)
+                done.add(p[0])
+            out.write("\t".join(p) + "\n")
+    missing = set(edits) - done
+    if missing:
+        raise ValueError(f"paths not in {paths_file}: {', '.join(sorted(missing))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply replace/splice/path patches to an indexed FASTA and Verkko paths.")
+    parser.add_argument("fasta", help="Uncompressed FASTA to patch (.fai built if missing)")
+    parser.add_argument("spec", help="Patch specification (see the header of this script)")
+    parser.add_argument("-o", "--output", help="Patched FASTA")
+    parser.add_argument("--changed-only", action="store_true", help="Only write the patched sequences")
+    parser.add_argument("--sources", nargs="+", default=[], help="Uncompressed FASTAs with the patch sequences")
+    parser.add_argument("--annotations", nargs="+", default=[],
+                        help="GFF/BED files to lift, written as <name>.patched.<ext> next to the output")
+    parser.add_argument("--paths", help="Verkko paths TSV for the path edits")
+    parser.add_argument("--paths-out", help="Patched paths TSV (default: <paths>.patched.tsv)")
+    args = parser.parse_args()
+
+    edits, path_edits = read_spec(args.spec)
+    if path_edits:
+        if not args.paths:
+            parser.error("the specification has path edits, --paths is required")
+        paths_out = args.paths_out or os.path.splitext(args.paths)[0] + ".patched.tsv"
+        patch_paths(args.paths, path_edits, paths_out)
+        print(f"[INFO] Saved {len(path_edits)} path edits to {paths_out}")
+
+    if edits:
+        if not args.output:
+            parser.error("the specification has sequence edits, -o/--output is required")
+        fasta = IndexedFasta(args.fasta, strict=True)
+        sources = [IndexedFasta(s, strict=True) for s in args.sources]
+        shifts = patch_fasta(fasta, edits, sources, args.output, args.changed_only)
+        write_shifts(shifts, args.output + ".shifts.tsv")
+        for ann in args.annotations:
+            stem, ext = os.path.splitext(os.path.basename(ann))
+            out_path = os.path.join(os.path.dirname(os.path.abspath(args.output)), f"{stem}.patched{ext}")
+            kept, dropped = lift_annotations(ann, out_path, shifts)
+            print(f"[INFO] {ann}: {kept} features shifted, {dropped} overlapping an edit dropped -> {out_path}")
+        print(f"[INFO] Saved {args.output} and {args.output}.shifts.tsv")